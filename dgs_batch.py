@@ -0,0 +1,184 @@
+# dgs_batch.py
+# batch driver for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_BATCH.PY
+ Runs the analysis of each image in a batch so that one bad image
+ (corrupt file, unreadable network share, an analysis which never
+ finishes) cannot stop the rest of the batch
+
+ Each image either succeeds, or fails and is recorded in a run report
+ (one line per image, written as the batch goes, so it survives a crash)
+ Failures reading from disk (errors with an errno, e.g. a network share
+ dropping out) are retried after a pause which doubles each time; other
+ errors, such as a file which is not an image, are not
+ With a timeout, each image is analysed in a child process which is
+ killed if it takes longer than that, together with any processes it
+ started (e.g. the workers of the process executor): the child is put
+ in a process group of its own, and the whole group is killed
+
+ Images can also be run in groups (e.g. of the same size, analysed together
+ by processbatch in dgs_core.py); if a group fails, its images are run
+ again one at a time, so a bad image only costs its group the fast path
+'''
+
+from __future__ import division, print_function
+import os, signal, time, traceback
+from multiprocessing import Process, Pipe
+
+################################################################
+def retryable(e):
+    """
+    true for errors worth trying again: input/output errors from the
+    operating system, rather than e.g. PIL not recognising a file
+    """
+    return isinstance(e, EnvironmentError) and e.errno is not None
+
+################################################################
+def isolated(analyse, item, args, conn):
+    """
+    child process: analyse one item and send back how it went
+    """
+    # a group of its own, so that any workers it starts are killed with it
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    try:
+        analyse(item, *args)
+        conn.send(('ok', False, ''))
+    except Exception as e:
+        conn.send(('failed', retryable(e), traceback.format_exc().strip().split('\n')[-1]))
+    conn.close()
+
+################################################################
+def killgroup(p):
+    """
+    kill child process p and every process it started (see isolated);
+    before p is joined, so that its group cannot have been reused
+    """
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            # no such group: it has gone already, or was never made
+            pass
+    p.terminate()
+    p.join()
+
+################################################################
+def runone(analyse, item, args, timeout):
+    """
+    analyse one item, in a child process if there is a timeout
+    returns (status, retryable, message), status is ok, failed or timeout
+    """
+    if not timeout:
+        try:
+            analyse(item, *args)
+            return 'ok', False, ''
+        except Exception as e:
+            return 'failed', retryable(e), traceback.format_exc().strip().split('\n')[-1]
+
+    parent, child = Pipe(False)
+    p = Process(target=isolated, args=(analyse, item, args, child))
+    p.start()
+    child.close()
+    try:
+        done = parent.poll(timeout)
+    except KeyboardInterrupt:
+        # the child is not in the terminal's group, so does not get the interrupt
+        killgroup(p)
+        raise
+    if done:
+        try:
+            result = parent.recv()
+            p.join()
+        except EOFError:
+            # the child died without a word (killed, out of memory, crashed),
+            # perhaps leaving workers behind
+            result = ('failed', False, 'analysis process died')
+            killgroup(p)
+        return result
+    killgroup(p)
+    return 'timeout', False, 'no result after '+str(timeout)+' s; analysis process killed'
+
+################################################################
+def runitem(analyse, item, args, retries, backoff, timeout):
+    """
+    analyse one item, trying again after a pause if the error is retryable
+    returns (status, attempts, message)
+    """
+    attempt = 0
+    while True:
+        attempt = attempt+1
+        status, again, message = runone(analyse, item, args, timeout)
+        if status=='ok' or not again or attempt > retries:
+            return status, attempt, message
+        wait = backoff*2**(attempt-1)
+        print('failed ('+message+'); trying again in '+str(wait)+' s')
+        time.sleep(wait)
+
+################################################################
+def record(f, item, status, attempts, seconds, message):
+    """
+    one line of the run report
+    """
+    if status!='ok':
+        print(status+': '+item+' ('+message+')')
+    f.write(', '.join([item, status, str(attempts), str(seconds), message.replace(',',';')])+'\n')
+    f.flush()
+
+################################################################
+def runbatch( files, analyse, args, report, retries=2, backoff=1., timeout=0, analysegroup=None ):
+    """
+    calls analyse(item, *args) for each item in files, isolating failures
+    and recording each item in the run report
+
+    if analysegroup is given, files is a list of groups (lists) of items,
+    and analysegroup(group, *args) is called for each group of more than
+    one item; if that fails, the items of the group are done one by one
+
+    returns the numbers of items which succeeded and failed
+    """
+    if analysegroup is None:
+        groups = [[item] for item in files]
+    else:
+        groups = files
+
+    ok = 0
+    failed = 0
+    with open(report,'w') as f:
+        f.write('% '+time.strftime('%l:%M%p %z on %b %d, %Y')+'\n')
+        f.write('% image, status, attempts, time (s), message\n')
+        f.flush()
+        for group in groups:
+            if len(group)>1:
+                print("===========================================")
+                print("Analysing "+str(len(group))+" images together, from "+group[0])
+                start = time.time()
+                status, again, message = runone(analysegroup, group, args, timeout*len(group))
+                if status=='ok':
+                    for item in group:
+                        record(f, item, status, 1, (time.time()-start)/len(group), '')
+                    ok = ok+len(group)
+                    continue
+                print('batch failed ('+message+'); analysing its images one by one')
+
+            for item in group:
+                print("===========================================")
+                print("Analysing "+item)
+                start = time.time()
+                status, attempts, message = runitem(analyse, item, args, retries, backoff, timeout)
+                if status=='ok':
+                    ok = ok+1
+                else:
+                    failed = failed+1
+                record(f, item, status, attempts, time.time()-start, message)
+
+    print(str(ok)+' images analysed, '+str(failed)+' failed; see '+report)
+    return ok, failed
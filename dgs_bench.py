@@ -0,0 +1,272 @@
+# dgs_bench.py
+# scaling benchmarks for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_BENCH.PY
+ Measures how the time and peak memory of the analysis grow with the size
+ of the image, the density, the number of processors and the way the
+ work is run (the executors in dgs_core.py: inline, as dgs_wav.py does,
+ and thread, process, joblib and auto, as dgs_wav_p.py does; any executor
+ added there can be named too), and how the time, and the accuracy, of
+ each wavelet family (see dgs_core.py) trade off against the number of
+ notes (scales per octave)
+
+ The images are synthetic beds of grains (see dgs_synth.py), square, one
+ for each size, written once to the work folder as memory mapped .npy
+ files and reused, so sizes of tens of thousands of pixels can be run.
+ Each analysis runs in its own child process (see dgs_regress.py), so one
+ does not warm up, or add to the memory of, the next
+
+ The grain size found is proportional to the true one, not equal to it,
+ so accuracy is measured over beds of several grain sizes: the error is
+ how far (rms, in percent) the sizes found are from the best proportional
+ fit to the true sizes
+
+ OPTIONAL INPUTS [default values]
+ folder = work folder, for the images and results [bench]
+ sizes = image sizes (pixels a side) [1024,2048,4096]
+ density = process every density lines of image, one or more [10]
+ numproc = numbers of processors [1 and all of them]
+ executors = ways of running the work [inline,thread,process]
+ wavelets = wavelet families, as dgs_wav.py takes them [morlet]
+ notes = numbers of notes (scales per octave) [8]
+ size = median grain diameters in mm, one or more [0.5]
+ sorting = sorting of grain diameter (phi) [0.5]
+ resolution = spatial resolution in mm/pixel [0.05]
+
+ OUTPUTS:
+ bench.txt in the work folder, a line per run: image size, density,
+ processors, executor, wavelet, notes, grain size (mm), time (s), peak
+ memory (MB), mean grain size found (mm)
+ bench_time.png and bench_memory.png: time and peak memory against image
+ size, a line for each executor, number of processors, density, wavelet,
+ notes and grain size
+ with more than one grain size, bench_wavelets.txt: for each wavelet and
+ number of notes, the mean time, the proportional fit and its error; and
+ bench_wavelets.png: error against time, a line for each wavelet
+
+ EXAMPLES:
+
+ 1) the default matrix
+ python dgs_bench.py
+
+ 2) large images on 1, 4 and 16 processors, threads against processes
+ python dgs_bench.py -f /scratch/bench -x 4096,8192,16384,32768 -n 1,4,16 -e thread,process
+
+ 3) the effect of density on one processor
+ python dgs_bench.py -x 2048 -d 20,10,5,2 -n 1 -e inline
+
+ 4) time against accuracy for each wavelet and number of notes, on beds of four grain sizes
+ python dgs_bench.py -x 1024 -n 1 -e inline -m morlet,paul,dog -v 4,8,16 -s 0.25,0.5,1,2
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from dgs_core import executors, getwavelet
+from dgs_tune import cores
+from dgs_synth import writebed
+from dgs_regress import runcase
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def benchimage( folder, n, size, sorting, resolution ):
+    """
+    name of the n pixel square synthetic image in folder, written first if
+    it is not there already
+    """
+    name = os.path.join(folder,'bench_%d_%g_%g_%g.npy' % (n, size, sorting, resolution))
+    if not os.path.isfile(name):
+        print('writing '+name)
+        writebed( name, n, n, size/(2.*resolution), sorting, 0 )
+    return name
+
+################################################################
+def runs( sizes, densities, numprocs, names, wavelets=['morlet'], notes=[8], grainsizes=[0.5] ):
+    """
+    the runs in the matrix: (size, density, numproc, executor, wavelet,
+    notes, grain size); inline uses one processor, so it is run once,
+    whatever numprocs are given
+    """
+    matrix = []
+    for n in sizes:
+        for density in densities:
+            for executor in names:
+                for numproc in ([1] if executor=='inline' else numprocs):
+                    for wavelet in wavelets:
+                        for v in notes:
+                            for size in grainsizes:
+                                matrix.append((n, density, numproc, executor, wavelet, v, size))
+    return matrix
+
+################################################################
+def plotcurves( results, column, label, png ):
+    """
+    plot column (7, time; 8, memory) of the results against image size,
+    a line for each executor, number of processors, density, wavelet,
+    notes and grain size
+    """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    lines = sorted(set([r[1:7] for r in results]))
+    for density, numproc, executor, wavelet, notes, size in lines:
+        points = sorted([(r[0], r[column]) for r in results if r[1:7]==(density, numproc, executor, wavelet, notes, size)])
+        ax.loglog([p[0] for p in points], [p[1] for p in points], 'o-',
+                  label=executor+', '+str(numproc)+' proc., density '+str(density)+', '+wavelet+' '+str(notes)+', '+str(size)+' mm')
+    ax.set_xlabel('Image size (pixels a side)')
+    ax.set_ylabel(label)
+    ax.legend(loc='upper left', fontsize='small')
+    fig.savefig(png)
+
+################################################################
+def tradeoff( results ):
+    """
+    for each wavelet and number of notes: (wavelet, notes, mean time (s),
+    k, error (%)), where k*size is the proportional fit to the mean grain
+    sizes found, and error the rms difference from it, in percent
+    """
+    table = []
+    for wavelet, notes in sorted(set([r[4:6] for r in results])):
+        rows = [r for r in results if r[4:6]==(wavelet, notes)]
+        t = np.array([r[6] for r in rows])
+        m = np.array([r[9] for r in rows])
+        k = np.sum(m*t)/np.sum(t*t)
+        error = 100*np.sqrt(np.mean((m/(k*t)-1)**2))
+        table.append((wavelet, notes, np.mean([r[7] for r in rows]), k, error))
+    return table
+
+################################################################
+def plottradeoff( table, png ):
+    """
+    plot the error of each wavelet (see tradeoff) against its time, a
+    point for each number of notes
+    """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    for wavelet in sorted(set([row[0] for row in table])):
+        points = [row for row in table if row[0]==wavelet]
+        ax.plot([p[2] for p in points], [p[4] for p in points], 'o-', label=wavelet)
+        for p in points:
+            ax.annotate(str(p[1]), (p[2], p[4]), fontsize='small')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Error (%), labelled with notes per octave')
+    ax.legend(loc='upper right', fontsize='small')
+    fig.savefig(png)
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("========SCALING BENCHMARKS=================")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   folder = ''; sizes = ''; density = ''; numproc = ''; names = ''
+   size = ''; sorting = ''; resolution = ''; wavelets = ''; notes = ''
+
+   usage = 'dgs_bench.py [[-f <work folder> -x <image sizes> -d <densities> -n <numbers of processors> -e <executors> -m <wavelets> -v <notes per octave> -s <median sizes (mm)> -g <sorting (phi)> -r <resolution (mm/pixel)> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hf:x:d:n:e:m:v:s:g:r:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-f"):
+         folder = arg
+      elif opt in ("-x"):
+         sizes = arg
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-n"):
+         numproc = arg
+      elif opt in ("-e"):
+         names = arg
+      elif opt in ("-m"):
+         wavelets = arg
+      elif opt in ("-v"):
+         notes = arg
+      elif opt in ("-s"):
+         size = arg
+      elif opt in ("-g"):
+         sorting = arg
+      elif opt in ("-r"):
+         resolution = arg
+
+   folder = folder if folder else 'bench'
+   sizes = [int(n) for n in sizes.split(',')] if sizes else [1024, 2048, 4096]
+   densities = [int(d) for d in density.split(',')] if density else [10]
+   numprocs = [int(n) for n in numproc.split(',')] if numproc else sorted(set([1, cores()]))
+   names = names.split(',') if names else ['inline', 'thread', 'process']
+   wavelets = wavelets.split(',') if wavelets else ['morlet']
+   notes = [int(v) for v in notes.split(',')] if notes else [8]
+   grainsizes = [float(s) for s in size.split(',')] if size else [0.5]
+   sorting = float(sorting) if sorting else 0.5
+   resolution = float(resolution) if resolution else 0.05
+
+   for executor in names:
+      if executor not in executors:
+         print('executor must be one of '+', '.join(sorted(executors)))
+         sys.exit(2)
+   for wavelet in wavelets:
+      try:
+         getwavelet(wavelet)
+      except ValueError as e:
+         print(e)
+         sys.exit(2)
+   if not os.path.isdir(folder):
+      os.makedirs(folder)
+
+   results = []
+   report = os.path.join(folder,'bench.txt')
+   with open(report,'w') as f:
+      f.write('% image size (pixels), density, processors, executor, wavelet, notes, grain size (mm), time (s), peak memory (MB), mean grain size found (mm)\n')
+      for n, density, numproc, executor, wavelet, v, size in runs( sizes, densities, numprocs, names, wavelets, notes, grainsizes ):
+         item = benchimage( folder, n, size, sorting, resolution )
+         print('analysing '+str(n)+' pixels of '+str(size)+' mm grains, density '+str(density)+', on '+str(numproc)+' processors with '+executor+', '+wavelet+' wavelet, '+str(v)+' notes')
+         result, seconds, memory = runcase( item, density, resolution, numproc, executor, wavelet, v )
+         results.append((n, density, numproc, executor, wavelet, v, size, seconds, memory, result[2]))
+         f.write('%d, %d, %d, %s, %s, %d, %g, %.3f, %.1f, %.4f\n' % results[-1])
+         f.flush()
+
+   plotcurves( results, 7, 'Time (s)', os.path.join(folder,'bench_time.png') )
+   plotcurves( results, 8, 'Peak memory (MB)', os.path.join(folder,'bench_memory.png') )
+   print('results saved to '+report+'; curves in bench_time.png and bench_memory.png')
+
+   if len(grainsizes)>1:
+      table = tradeoff( results )
+      with open(os.path.join(folder,'bench_wavelets.txt'),'w') as f:
+         f.write('% wavelet, notes, mean time (s), size found/true size, error (%)\n')
+         for row in table:
+            f.write('%s, %d, %.3f, %.4f, %.2f\n' % row)
+            print('%s, %d notes: %.3f s, error %.2f %%' % (row[0], row[1], row[2], row[4]))
+      plottradeoff( table, os.path.join(folder,'bench_wavelets.png') )
+      print('time against accuracy saved to bench_wavelets.txt and bench_wavelets.png')
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
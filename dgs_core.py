@@ -0,0 +1,966 @@
+# dgs_core.py
+# the analysis behind dgs_wav.py and dgs_wav_p.py: wavelet-based digital grain size analysis
+# Written by Daniel Buscombe, various times in 2012 and 2013
+# while at
+# School of Marine Science and Engineering, University of Plymouth, UK
+# then
+# Grand Canyon Monitoring and Research Center, U.G. Geological Survey, Flagstaff, AZ 
+# please contact:
+# dbuscombe@usgs.gov
+# for lastest code version please visit:
+# https://github.com/dbuscombe-usgs
+# see also (project blog):
+# http://dbuscombe-usgs.github.com/
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came 
+#   from the United States Geological Survey, an agency of the United States Department of Interior. 
+#   For more information, see the official USGS copyright policy at 
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+'''
+ DGS_CORE.PY
+ The grain size analysis itself, shared by the serial (dgs_wav.py) and
+ parallel (dgs_wav_p.py) programs, which only read their inputs and
+ choose how it is run, and by dgs_dist.py, dgs_server.py and dgs_stream.py
+
+ The sampled columns of an image are transformed in tasks, each a block
+ of neighbouring columns (see processimage). How the tasks are run is
+ chosen by name (executor):
+
+ inline:  one after another in this process, as one block; the Fourier
+          transforms may still use all processors (see dgs_fft.py)
+ thread:  a pool of numproc threads in this process, sharing the columns
+          and the plan without copying them. Most of the work is in Fourier
+          transforms and numpy arithmetic on large arrays, which release
+          the GIL, so threads can keep several processors busy
+ process: a pool of numproc worker processes, each given the columns and
+          building its plan once
+ joblib:  joblib's Parallel, with numproc jobs (joblib must be installed)
+ auto:    threads if they run tasks side by side well enough, else
+          processes (the default in dgs_wav_p.py). The first tasks are
+          timed, one alone and then a few at once on threads, and the
+          choice is kept for the rest of the run
+
+ Images themselves are spread over processes (with a timeout) by
+ dgs_batch.py, and over machines by dgs_dist.py, whatever the executor
+
+ The wavelet is chosen by name (wavelets): the Morlet (the default), or
+ the Paul or derivative of Gaussian (DOG) wavelets, with an order if not
+ their usual one (1 to 40, e.g. paul6, dog4), and notes (scales per
+ octave; 8 by default). The Paul and DOG wavelets are narrower in
+ frequency or in time than the Morlet, and may need fewer notes, and so
+ fewer scales to transform. Their scales are matched to the Morlet's (a scale is the
+ same Fourier period, and so the same grain size, whichever the wavelet)
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import time, threading
+from functools import reduce, partial
+from math import factorial, gamma
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from dgs_fft import fft, ifft, fftconvolve, shareworkers
+from dgs_plan import getplan
+from dgs_stats import getstats, summarise, percentiles, bootstrap, accumulate, merge, variance
+from dgs_tune import tune
+from dgs_plot import saveplot
+from dgs_io import readimage, imagesize, depth
+from dgs_store import getstore
+
+try:
+    import joblib
+except ImportError:
+    joblib = None
+
+# with auto, threads are used if n tasks at once on n threads are done at least
+# 1+threadgain*(n-1) times as fast as one after another (1 = perfectly parallel)
+threadgain = 0.5
+
+# executors chosen by auto, keyed by task function and number of workers
+_chosen = {}
+
+# each thread's own scratch space
+_local = threading.local()
+
+# rows of the illumination surface worked out at once, in flattening windows
+flattenrows = 1
+
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def sgolay2d ( z, window_size, order, derivative=None, out=None, rows=None):
+    """
+    do 2d filtering on matrix
+    from http://www.scipy.org/Cookbook/SavitzkyGolay
+    the padded matrix is single precision; if derivative is None, the
+    result can be written into out, rows of it at a time (see dgs_fft.py)
+    """
+    # number of terms in the polynomial expression
+    n_terms = ( order + 1 ) * ( order + 2)  / 2.0
+
+    if  window_size % 2 == 0:
+        raise ValueError('window_size must be odd')
+
+    if window_size**2 < n_terms:
+        raise ValueError('order is too high for the window size')
+
+    half_size = window_size // 2
+
+    # exponents of the polynomial. 
+    # p(x,y) = a0 + a1*x + a2*y + a3*x^2 + a4*y^2 + a5*x*y + ... 
+    # this line gives a list of two item tuple. Each tuple contains 
+    # the exponents of the k-th term. First element of tuple is for x
+    # second element for y.
+    # Ex. exps = [(0,0), (1,0), (0,1), (2,0), (1,1), (0,2), ...]
+    exps = [ (k-n, n) for k in range(order+1) for n in range(k+1) ]
+
+    # coordinates of points
+    ind = np.arange(-half_size, half_size+1, dtype=np.float64)
+    dx = np.repeat( ind, window_size )
+    dy = np.tile( ind, [window_size, 1]).reshape(window_size**2, )
+
+    # build matrix of system of equation
+    A = np.empty( (window_size**2, len(exps)) )
+    for i, exp in enumerate( exps ):
+        A[:,i] = (dx**exp[0]) * (dy**exp[1])
+
+    # pad input array with appropriate values at the four borders
+    new_shape = z.shape[0] + 2*half_size, z.shape[1] + 2*half_size
+    Z = np.zeros( (new_shape), 'f' )
+    # top band
+    band = z[0, :]
+    Z[:half_size, half_size:-half_size] =  band -  np.abs( np.flipud( z[1:half_size+1, :] ) - band )
+    # bottom band
+    band = z[-1, :]
+    Z[-half_size:, half_size:-half_size] = band  + np.abs( np.flipud( z[-half_size-1:-1, :] )  -band )
+    # left band
+    band = np.tile( z[:,0].reshape(-1,1), [1,half_size])
+    Z[half_size:-half_size, :half_size] = band - np.abs( np.fliplr( z[:, 1:half_size+1] ) - band )
+    # right band
+    band = np.tile( z[:,-1].reshape(-1,1), [1,half_size] )
+    Z[half_size:-half_size, -half_size:] =  band + np.abs( np.fliplr( z[:, -half_size-1:-1] ) - band )
+    # central band
+    Z[half_size:-half_size, half_size:-half_size] = z
+
+    # top left corner
+    band = z[0,0]
+    Z[:half_size,:half_size] = band - np.abs( np.flipud(np.fliplr(z[1:half_size+1,1:half_size+1]) ) - band )
+    # bottom right corner
+    band = z[-1,-1]
+    Z[-half_size:,-half_size:] = band + np.abs( np.flipud(np.fliplr(z[-half_size-1:-1,-half_size-1:-1]) ) - band )
+
+    # top right corner
+    band = Z[half_size,-half_size:]
+    Z[:half_size,-half_size:] = band - np.abs( np.flipud(Z[half_size+1:2*half_size+1,-half_size:]) - band )
+    # bottom left corner
+    band = Z[-half_size:,half_size].reshape(-1,1)
+    Z[-half_size:,:half_size] = band - np.abs( np.fliplr(Z[-half_size:, half_size+1:2*half_size+1]) - band )
+
+    # solve system and convolve
+    if derivative == None:
+        # only the first row of pinv(A) is needed: from the (small) normal
+        # equations, with the coordinates scaled to -1..1 so they are well
+        # conditioned (which leaves that row unchanged)
+        A /= np.array([float(half_size)**(exp[0]+exp[1]) for exp in exps])
+        m = np.dot(A, np.linalg.solve(np.dot(A.T,A), np.eye(len(exps))[0])).reshape((window_size, -1))
+        m = m.astype('f')
+        return fftconvolve(Z, m, mode='valid', out=out, rows=rows)
+    elif derivative == 'col':
+        A = A.astype('f')
+        c = np.linalg.pinv(A)[1].reshape((window_size, -1))
+        return fftconvolve(Z, -c, mode='valid')
+    elif derivative == 'row':
+        A = A.astype('f')
+        r = np.linalg.pinv(A)[2].reshape((window_size, -1))
+        return fftconvolve(Z, -r, mode='valid')
+    elif derivative == 'both':
+        A = A.astype('f')
+        c = np.linalg.pinv(A)[1].reshape((window_size, -1))
+        r = np.linalg.pinv(A)[2].reshape((window_size, -1))
+        return fftconvolve(Z, -r, mode='valid'), fftconvolve(Z, -c, mode='valid')
+
+################################################################
+def iseven(n):
+   """Return true if n is even."""
+   return n%2==0
+
+################################################################
+def isodd(n):
+   """Return true if n is odd."""   
+   return not iseven(n)
+
+################################################################
+def rescale(dat,mn,mx,out=None):
+    """
+    rescales an input dat between mn and mx
+    (into out, if given, which may be dat itself)
+    """
+    m = np.min(dat)
+    M = np.max(dat)
+    if out is None:
+        return (mx-mn)*(dat-m)/(M-m)+mn
+    np.subtract(dat, m, out)
+    out *= (mx-mn)
+    out /= (M-m)
+    out += mn
+    return out
+
+################################################################
+def flatten(region):
+    """
+    removes large scale trends in illumination from an image by subtracting
+    a smooth 2d polynomial surface, then rescales to the full 8-bit range
+    the surface, the difference and the rescaled image are all one float32
+    array, and the surface is worked out a strip of rows at a time
+    """
+    mn = min(np.shape(region))
+    try:
+        if isodd(mn//4):
+             window_size = (mn//4)
+        else:
+             window_size = (mn//4)-1
+        useregion = np.empty(np.shape(region), np.float32)
+        sgolay2d( region, window_size, order=3, out=useregion, rows=flattenrows*window_size )
+
+        # rescale filtered image to full 8-bit range
+        np.subtract(region, useregion, useregion)
+        rescale(useregion,0,255,useregion)
+
+    except (ValueError, MemoryError) as e:
+        # too small, or too big, to flatten; carry on without
+        print("flattening failed: "+str(e))
+        useregion = region
+
+    return useregion
+
+################################################################
+def cropcentral(im):
+    """
+    crop image (numpy array) to central box (a copy)
+    """
+    nrows, ncols = np.shape(im)
+    size = min(nrows, ncols)
+    originX = ncols // 2 - size // 2
+    originY = nrows // 2 - size // 2
+    return np.array(im[originY:originY + size, originX:originX + size])
+
+################################################################
+def getmult(region, levels=None):
+    """
+    shape of the Kaiser window for an image region (see dgs_stats.py),
+    from its standard deviation in 8-bit grey levels whatever the bit
+    depth of the image (levels, if not that of region; see dgs_io.py)
+    """
+    s = np.std(region.flatten())
+    if region.dtype!=np.uint8:
+        s = s*255./(depth(region) if levels is None else levels)
+    return 6*int(float(100*(1/s)))
+
+################################################################
+def log2(x):
+     """
+     utility function to return (integer) log2
+     """
+     return int( np.log(float(x))/ np.log(2.0)+0.0001 )
+
+################################################################
+class Cwt:
+    """
+    Base class for continuous wavelet transforms
+    Implements cwt via the Fourier transform
+    Used by subclass which provides the method wf(self,s_omega)
+    wf is the Fourier transform of the wavelet function.
+    Returns an instance.
+    """
+
+    fourierwl=1.00
+    order=2
+
+################################################################
+    def _log2(self, x):
+        # utility function to return (integer) log2
+        return int( np.log(float(x))/ np.log(2.0)+0.0001 )
+
+################################################################
+    def __init__(self, data, largestscale=1, notes=0, order=None, scaling='linear', scalelength=None):
+        """
+        Continuous wavelet transform of data
+
+        data:    data in array to transform, length must be even
+        notes:   number of scale intervals per octave
+        largestscale: largest scale as inverse fraction of length
+                 of data array
+                 scale = len(data)/largestscale
+                 smallest scale should be >= 2 for meaningful data
+        order:   Order of wavelet basis function for some families
+                 [the family's usual one]
+        scaling: Linear or log
+        scalelength: length the scales are set from, if not len(data)
+                 (so data padded to different lengths share scales)
+        """
+        ndata = len(data)
+        if order is not None: self.order = order
+        self.scale = largestscale
+        if scalelength is None: scalelength = ndata
+        self._setscales(scalelength,largestscale,notes,scaling)
+        self.cwt = np.zeros((self.nscale,ndata), np.complex64)
+        omega = np.array(list(range(0,ndata//2))+list(range(-ndata//2,0)))*(2.0*np.pi/ndata)
+        datahat = fft(data)
+        self.fftdata = datahat
+        #self.psihat0=self.wf(omega*self.scales[3*self.nscale/4])
+        # loop over scales and compute wvelet coeffiecients at each scale
+        # using the fft to do the convolution
+        for scaleindex in range(self.nscale):
+            currentscale = self.scales[scaleindex]
+            self.currentscale = currentscale  # for internal use
+            s_omega = omega*currentscale
+            psihat = self.wf(s_omega)
+            psihat = psihat *  np.sqrt(2.0*np.pi*currentscale)
+            convhat = psihat * datahat
+            W    = ifft(convhat)
+            self.cwt[scaleindex,0:ndata] = W 
+        return
+
+################################################################    
+    def _setscales(self,ndata,largestscale,notes,scaling):
+        """
+        if notes non-zero, returns a log scale based on notes per ocave
+        else a linear scale
+        notes!=0 case so smallest scale at [0]
+        """
+        if scaling=="log":
+            if notes<=0: notes=1 
+            # adjust nscale so smallest scale is 2 
+            noctave = self._log2( ndata//largestscale//2 )
+            self.nscale = notes*noctave
+            self.scales = np.zeros(self.nscale,float)
+            for j in range(self.nscale):
+                self.scales[j] = ndata/(self.scale*(2.0**(float(self.nscale-1-j)/notes)))
+        elif scaling=="linear":
+            nmax = ndata//largestscale//2
+            self.scales = np.arange(float(2),float(nmax))
+            self.nscale = len(self.scales)
+        else: raise ValueError("scaling must be linear or log")
+        return
+ 
+################################################################   
+    def getdata(self):
+        """
+        returns wavelet coefficient array
+        """
+        return self.cwt
+
+################################################################
+    def getcoefficients(self):
+        return self.cwt
+
+################################################################
+    def getpower(self):
+        """
+        returns square of wavelet coefficient array
+        """
+        return (self.cwt* np.conjugate(self.cwt)).real
+
+################################################################
+    def getscales(self):
+        """
+        returns array containing scales used in transform
+        """
+        return self.scales
+
+################################################################
+    def getnscale(self):
+        """
+        return number of scales
+        """
+        return self.nscale
+
+################################################################
+# wavelet classes    
+class Morlet(Cwt):
+    """
+    Morlet wavelet
+    """
+    _omega0 = 6.0 #5.0
+    fourierwl = 4* np.pi/(_omega0+ np.sqrt(2.0+_omega0**2))
+
+################################################################
+    def wf(self, s_omega):
+        # zero for negative frequencies
+        H = np.where(s_omega < 0.0, 0.0, 1.0)
+        # !!!! note : was s_omega/8 before 17/6/03
+        xhat = 0.75112554*( np.exp(-(s_omega-self._omega0)**2/2.0))*H
+        return xhat
+
+################################################################
+class Paul(Cwt):
+    """
+    Paul wavelet of order m (4 unless given, 1 to maxorder)
+    """
+    order = 4
+    maxorder = 40
+
+################################################################
+    def wf(self, s_omega):
+        m = self.order
+        # the Morlet's Fourier period at the same scale
+        x = s_omega*(Morlet.fourierwl/(4*np.pi/(2*m+1)))
+        # zero for negative frequencies
+        x = np.where(x < 0.0, 0.0, x)
+        return 2.0**m/np.sqrt(m*float(factorial(2*m-1)))*x**m*np.exp(-x)
+
+################################################################
+class DOG(Cwt):
+    """
+    derivative of Gaussian wavelet of order m (2, the Mexican hat, unless
+    given, 1 to maxorder)
+    """
+    order = 2
+    maxorder = 40
+
+################################################################
+    def wf(self, s_omega):
+        m = self.order
+        # the Morlet's Fourier period at the same scale
+        x = s_omega*(Morlet.fourierwl/(2*np.pi/np.sqrt(m+0.5)))
+        return -(1j**m)/np.sqrt(gamma(m+0.5))*x**m*np.exp(-x*x/2.0)
+
+# wavelet families, by name
+wavelets = {'morlet': Morlet, 'paul': Paul, 'dog': DOG}
+
+################################################################
+def getwavelet( name ):
+    """
+    wavelet family and order from its name, e.g. morlet, paul, dog4
+    (the order is None for the family's usual one)
+    """
+    families = [f for f in wavelets if name.lower().startswith(f)]
+    if not families or (families[0]=='morlet' and name.lower()!='morlet'):
+        raise ValueError("wavelet must be one of "+", ".join(sorted(wavelets))+", with an order for paul or dog (e.g. dog4)")
+    family = families[0]
+    order = name[len(family):]
+    # beyond maxorder the wavelet overflows at the largest scales
+    if order and not (order.isdigit() and 1<=int(order)<=wavelets[family].maxorder):
+        raise ValueError("the order of the "+family+" wavelet must be a whole number from 1 to "+str(wavelets[family].maxorder)+" (e.g. "+family+str(wavelets[family].order)+")")
+    return wavelets[family], int(order) if order else None
+
+################################################################
+def waveletplan( ny, wavelet='morlet', notes=8, pad='fast', scales=None ):
+    """
+    the (cached) plan for columns of length ny, with the named wavelet and
+    notes per octave (see getplan in dgs_plan.py); scales is a scalerange
+    """
+    family, order = getwavelet(wavelet)
+    return getplan(ny, family, 3, notes, "log", pad, scales, order)
+
+################################################################
+def plansettings( plan ):
+    """
+    the settings a plan was made with, for initworker
+    """
+    return (plan.wavelet, plan.maxscale, plan.notes, plan.scaling, plan.pad, plan.scalerange, plan.order)
+
+################################################################
+def scalerange( sizes, resolution ):
+    """
+    range of scales (pixels) for a range of grain sizes (mm), (smallest,
+    largest) either of which may be None; None for all scales (see dgs_plan.py)
+    """
+    if sizes is None:
+        return None
+    return tuple([None if s is None else s/(1.5*resolution) for s in sizes])
+
+################################################################
+def processimage( item, density, doplot, resolution, folder, numproc, nboot=0, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8 ):
+    """
+    main processing program which reads image and calculates grain size distribution
+    numproc workers (or 'auto') run the column tasks with executor (see above)
+    band is the band of a colour image to analyse (see dgs_io.py) [luminance]
+    sizes is the (smallest, largest) grain size (mm) to look for [all]
+    wavelet and notes (per octave) choose the wavelet transform (see above)
+    """
+    # an image which cannot be read raises IOError, for the batch driver to deal with
+    im = readimage(item, band)
+
+    # crop a square box from centre of image
+    region = cropcentral(im)
+    nx, ny = np.shape(region)
+
+    # resize image so it is half the size (to reduce computational time)
+    #useregion= np.array(imresize(region,(( nx/2, ny/2 )))).T
+    #nx, ny = np.shape(useregion)
+
+    mult = getmult(region)
+
+    useregion = flatten(region)
+
+    # padded lengths, scales and smoothing wavenumbers for this size of image
+    # (log scaling, notes suboctaves per octave)
+    plan = waveletplan(ny, wavelet, notes, 'fast', scalerange(sizes, resolution))
+    scales = plan.getscales()
+
+    print('analysing every ',density,' rows of a ',nx,' row image')
+    columns = np.ascontiguousarray(useregion[:,1:nx-1:density])
+    ncol = np.shape(columns)[1]
+    # workers, and columns per task, to suit the image and this machine
+    numproc, chunk = workers(plan, ncol, numproc, executor)
+    print('in tasks of ',chunk,' columns on ',numproc,' processors')
+    # each task is a block of neighbouring columns; only the columns
+    # themselves are kept if they are needed, for the bootstrap
+    tasks = [(i, min(i+chunk,ncol)) for i in range(0,ncol,chunk)]
+    d = transformcolumns( columns, tasks, numproc, chunk, plansettings(plan), nboot>0, executor )
+
+    # grain size distribution and its moments (see dgs_stats.py)
+    V = variance(reduce(merge, [a for t in d for k, a in t[2]]))
+    scales, svarcwt, mnsz, srt, sk, kurt = summarise(V, scales, ny, [mult], resolution)
+    svarcwt, mnsz, srt, sk, kurt = svarcwt[0], mnsz[0], srt[0], sk[0], kurt[0]
+    print("mean size = ", mnsz) 
+    print("stdev = ",srt) 
+    print("skewness = ",sk)
+    print("kurtosis = ",kurt)
+
+    # confidence intervals, from resamples of the columns already transformed
+    ci = None
+    if nboot:
+       Or1 = np.vstack([t[3] for t in d]).T
+       ci = bootstrap(Or1, plan.getscales(), ny, mult, resolution, nboot)
+       print("95% confidence interval on mean size = ",ci[0])
+
+    if doplot:
+       # the plot itself is drawn in the background (see dgs_plot.py)
+       saveplot( item, folder, im, region, scales, svarcwt, mnsz )
+
+    return scales, svarcwt, mnsz, srt, sk, kurt, ci
+
+################################################################
+def writeout( item, sz, pdf, mnsz, srt, sk, kurt, resolution, ci=None, store=None ):
+    """
+    writes results to file, and adds them to store (a folder; see
+    dgs_store.py) if given
+    """
+
+    with open(item+'_psd.txt', 'w') as f:
+     np.savetxt(f, np.hstack((ascol(sz),ascol(pdf))), delimiter=', ', fmt='%s')   
+    print('psd results saved to ',item,'_psd.txt')
+
+    title = item+ "_summary.txt"
+    fout = open(title,"w")
+
+    fout.write("%"+time.strftime('%l:%M%p %z on %b %d, %Y')+"\n") 
+
+    fout.write("% grain size results ..."+"\n")
+    fout.write("% resolution:\n")
+    fout.write(str(resolution)+"\n")
+    fout.write('% mean grain size:'+"\n")
+    fout.write(str(mnsz)+"\n")
+    fout.write('% sorting :'+"\n")
+    fout.write(str(srt)+"\n")
+    fout.write('% skewness :'+"\n")
+    fout.write(str(sk)+"\n")
+    fout.write('% kurtosis :'+"\n")
+    fout.write(str(kurt)+"\n")
+    D16, D50, D84 = percentiles(pdf, sz)[0]
+    fout.write('% D16, D50, D84 :'+"\n")
+    fout.write(str(D16)+', '+str(D50)+', '+str(D84)+"\n")
+    if ci is not None:
+        fout.write('% 95% confidence intervals (bootstrap) on mean grain size, sorting, skewness, kurtosis :'+"\n")
+        for lower, upper in ci:
+            fout.write(str(lower)+', '+str(upper)+"\n")
+
+    fout.close()
+    print('summary results saved to ',title)
+
+    if store:
+        if getstore(store).append(item, sz, pdf, (mnsz, srt, sk, kurt, D16, D50, D84), resolution, ci):
+            print('results added to store ',store)
+        else:
+            print(item,' is in store ',store,' already; not added again')
+
+################################################################
+def ascol( arr ):
+    '''
+    reshapes row matrix to be a column matrix (N,1).
+    '''
+    if len( arr.shape ) == 1: arr = arr.reshape( ( arr.shape[0], 1 ) )
+    return arr
+
+################################################################
+def workers( plan, ncol, numproc, executor='auto', chunk=None ):
+    """
+    number of workers, and columns per task, for ncol columns with plan
+    (see dgs_tune.py), and share the processors between the workers;
+    inline, everything is one task (or chunk columns) in this process
+    returns numproc, chunk
+    """
+    if executor=='inline':
+        return 1, chunk or ncol
+    numproc, chunk = tune(plan, ncol, numproc, chunk)
+    shareworkers(numproc)
+    return numproc, chunk
+
+################################################################
+def initworker( columns, settings, chunk, keep, ncol=None ):
+    """
+    worker initialiser: the worker's state, which keeps the sampled columns
+    (ny, ncolumns) and the plan for the settings (wavelet, maxscale, notes,
+    scaling, pad, scalerange, order; see dgs_plan.py), built once for the
+    worker's lifetime (each thread has its own buffer for chunk padded
+    columns); if keep, tasks return their transformed columns as well as
+    accumulators. The columns are of images ncol columns each, one after
+    another [all of one image]
+    """
+    plan = getplan(np.shape(columns)[0], *settings)
+    return {'columns': columns, 'plan': plan, 'keep': keep, 'chunk': chunk,
+            'ncol': ncol or np.shape(columns)[1]}
+
+################################################################
+def parallel_me(worker, task):
+   # transform columns start to stop of the worker's columns
+   # returns start, stop, (image, accumulator) for each image the block
+   # spans (see dgs_stats.py), and the transformed columns, or None
+   start, stop = task
+   plan = worker['plan']
+   shape = (worker['chunk'], plan.nfft)
+   if getattr(_local, 'buffer', None) is None or np.shape(_local.buffer)!=shape:
+      _local.buffer = np.zeros(shape)
+   Y = plan.prepare(worker['columns'][:,start:stop], _local.buffer[:stop-start])
+   D = plan.transform(Y)
+   ncol = worker['ncol']
+   bounds = [start]+list(range((start//ncol+1)*ncol, stop, ncol))+[stop]
+   parts = [(bounds[j]//ncol, accumulate(D[bounds[j]-start:bounds[j+1]-start])) for j in range(len(bounds)-1)]
+   return start, stop, parts, D if worker['keep'] else None
+
+################################################################
+def transformcolumns( columns, tasks, numproc, chunk, settings, keep=False, executor='auto', ncol=None ):
+    """
+    transform blocks of columns (tasks are (start, stop) ranges of columns,
+    at most chunk long) with numproc workers; the columns are of images
+    ncol columns each (see initworker)
+    returns the results of parallel_me, in the order of tasks
+    """
+    return execute( parallel_me, tasks, numproc, executor, initworker, (columns, settings, chunk, keep, ncol) )
+
+################################################################
+def runinline( function, tasks, numproc, initializer, initargs ):
+    """
+    run the tasks here, one after another
+    """
+    return list(map(partial(function, initializer(*initargs)), tasks))
+
+################################################################
+def runthreads( function, tasks, numproc, initializer, initargs ):
+    """
+    run the tasks on a pool of numproc threads, sharing what initializer sets up
+    """
+    state = initializer(*initargs)
+    pool = ThreadPool(numproc)
+    try:
+        return pool.map(partial(function, state), tasks, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+################################################################
+def runprocesses( function, tasks, numproc, initializer, initargs ):
+    """
+    run the tasks on a pool of numproc processes, each set up once by initializer
+    """
+    pool = Pool(numproc, initprocess, (initializer, initargs))
+    try:
+        d = pool.map(partial(inprocess, function), tasks, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return d
+
+################################################################
+def noinit(*args):
+   # for tasks which need no set up
+   return None
+
+################################################################
+def initprocess( initializer, initargs ):
+    # a worker process's state is kept for its lifetime; only worker
+    # processes keep it here, as each has only the one
+    global _worker
+    _worker = initializer(*initargs)
+
+################################################################
+def inprocess( function, task ):
+    # run a task in a worker process, with the state initprocess set up
+    return function(_worker, task)
+
+################################################################
+def initialised( initializer, initargs, function, task ):
+    # joblib has no worker initialiser, so each task sets up its worker
+    # (joblib passes large arrays in initargs as memory maps, not copies)
+    return function(initializer(*initargs), task)
+
+################################################################
+def runjoblib( function, tasks, numproc, initializer, initargs ):
+    """
+    run the tasks as numproc joblib jobs
+    """
+    if joblib is None:
+        raise ImportError("joblib is not installed")
+    return joblib.Parallel(n_jobs = numproc, verbose=0)(joblib.delayed(initialised)(initializer, initargs, function, task) for task in tasks)
+
+################################################################
+def runauto( function, tasks, numproc, initializer, initargs ):
+    """
+    run the tasks on threads or processes, whichever suits them (see above):
+    the first time, one task is timed here, then the next numproc at once
+    on threads, and the rest run with the executor chosen
+    """
+    key = (function.__name__, numproc)
+    if key in _chosen:
+        return executors[_chosen[key]]( function, tasks, numproc, initializer, initargs )
+    n = min(numproc, len(tasks)-1)
+    if n<2:
+        return runthreads( function, tasks, numproc, initializer, initargs )
+
+    start = time.time()
+    d = runinline( function, tasks[:1], 1, initializer, initargs )
+    alone = time.time()-start
+    start = time.time()
+    d = d+runthreads( function, tasks[1:n+1], n, initializer, initargs )
+    together = time.time()-start
+
+    speedup = n*alone/max(together,1e-9)
+    _chosen[key] = 'thread' if speedup>=1+threadgain*(n-1) else 'process'
+    print('threads ran ',n,' tasks at once ',round(speedup,2),' times as fast: using the ',_chosen[key],' executor')
+    return d+executors[_chosen[key]]( function, tasks[n+1:], numproc, initializer, initargs )
+
+# ways of running tasks, by name
+executors = {'inline': runinline, 'thread': runthreads, 'process': runprocesses,
+             'joblib': runjoblib, 'auto': runauto}
+
+################################################################
+def execute( function, tasks, numproc, executor='auto', initializer=None, initargs=() ):
+    """
+    run function(state, task) on each of tasks, with numproc workers, the
+    state of each set up by initializer(*initargs), using the named executor
+    (see above). Workers in this process (inline, thread) are given their
+    state with each task, so calls running at once do not share it
+    returns the results, in the order of tasks
+    """
+    if executor not in executors:
+        raise ValueError("executor must be one of "+", ".join(sorted(executors)))
+    if initializer is None:
+        initializer = noinit
+    if (numproc==1 and executor!='joblib') or not tasks:
+        executor = 'inline'
+    return executors[executor]( function, tasks, numproc, initializer, initargs )
+
+################################################################
+def analyseimage( item, density, doplot, resolution, folder, numproc, window, overlap, nboot=0, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8, store=None ):
+    """
+    analyse one image and write the results to file (and to store, if
+    given; grain size maps are not stored)
+    """
+    if window:
+        rc, cc, mnsz, srt = processtiles( item, density, resolution, window, overlap, numproc, executor, band, sizes, wavelet, notes )
+        writetiles( item, rc, cc, mnsz, srt, window )
+    else:
+        sz, pdf, mnsz, srt, sk, kurt, ci = processimage( item, density, doplot, resolution, folder, numproc, nboot, executor, band, sizes, wavelet, notes )
+        writeout( item, sz, pdf, mnsz, srt, sk, kurt, resolution, ci, store )
+
+################################################################
+def analysegroup( items, density, doplot, resolution, folder, numproc, window, overlap, nboot=0, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8, store=None ):
+    """
+    analyse a batch of images of the same size together, and write the
+    results for each to file (no plots, or maps, in batch mode)
+    """
+    results = processbatch( items, density, resolution, numproc, nboot, executor, band, sizes, wavelet, notes )
+    for item, (sz, pdf, mnsz, srt, sk, kurt, ci) in zip(items, results):
+        print(item+": mean size = ", mnsz)
+        writeout( item, sz, pdf, mnsz, srt, sk, kurt, resolution, ci, store )
+
+################################################################
+def samesize( files, n ):
+    """
+    groups files by image dimensions (read from the header only),
+    in groups of up to n; files which cannot be read are left on their own
+    """
+    sizes = {}
+    groups = []
+    for item in files:
+        try:
+            size = imagesize(item)
+        except IOError:
+            groups.append([item])
+            continue
+        sizes.setdefault(size,[]).append(item)
+    for size in sorted(sizes):
+        group = sizes[size]
+        groups = groups+[group[i:i+n] for i in range(0,len(group),n)]
+    return groups
+
+################################################################
+def processbatch( items, density, resolution, numproc, nboot=0, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8 ):
+    """
+    calculates grain size distributions of a batch of images of the same size
+    the sampled columns of every image are stacked into one block, which is
+    transformed in blocks of neighbouring columns, which may span several
+    images, and the parts of each image combined. This saves the per-call
+    overhead of many small transforms
+    returns a list of (scales, svarcwt, mnsz, srt, sk, kurt, ci), one per image
+    (ci are bootstrap confidence intervals, if nboot, else None)
+    """
+    blocks = []
+    mults = []
+    for item in items:
+        region = cropcentral(readimage(item, band))
+        nx, ny = np.shape(region)
+        mults.append(getmult(region))
+        blocks.append(flatten(region)[:,1:nx-1:density])
+    if len(set([np.shape(b) for b in blocks]))>1:
+        raise ValueError('images in a batch must all be the same size')
+
+    # same wavelet settings as processimage
+    plan = waveletplan(ny, wavelet, notes, 'fast', scalerange(sizes, resolution))
+    columns = np.hstack(blocks)
+    ncol = np.shape(blocks[0])[1]
+
+    print('analysing every ',density,' rows of ',len(items),' images of ',nx,' rows')
+    numproc, chunk = workers(plan, len(items)*ncol, numproc, executor)
+    # tasks may span images (small images are then transformed several
+    # at once); each task splits its accumulators where images meet
+    total = len(items)*ncol
+    tasks = [(i, min(i+chunk,total)) for i in range(0,total,chunk)]
+    d = transformcolumns( columns, tasks, numproc, chunk, plansettings(plan), nboot>0, executor, ncol )
+
+    # column-wise variance of each image, then all their statistics together
+    parts = [[] for item in items]
+    for t in d:
+        for k, a in t[2]:
+            parts[k].append(a)
+    V = np.vstack([variance(reduce(merge, a)) for a in parts])
+    sz, P, mnsz, srt, sk, kurt = summarise(V, plan.getscales(), ny, mults, resolution)
+    ci = [None]*len(items)
+    if nboot:
+        D = np.vstack([t[3] for t in d])
+        ci = [bootstrap(D[i*ncol:(i+1)*ncol].T, plan.getscales(), ny, mults[i], resolution, nboot) for i in range(len(items))]
+    return [(sz, P[i], mnsz[i], srt[i], sk[i], kurt[i], ci[i]) for i in range(len(items))]
+
+################################################################
+def processregion( region, density, resolution, pad='fast', sizes=None, wavelet='morlet', notes=8 ):
+    """
+    calculates grain size distribution of a square image region (numpy array)
+    in this process, using a cached plan so that many regions of the same
+    size (video frames, uploaded images) share one
+    pad is 'fast' or 'pow2' (see dgs_plan.py)
+    """
+    region = np.asarray(region)
+    nx, ny = np.shape(region)
+
+    mult = getmult(region)
+
+    useregion = flatten(region)
+
+    # same wavelet settings as processimage
+    plan = waveletplan(ny, wavelet, notes, pad, scalerange(sizes, resolution))
+    dat = plan.transform(plan.prepare(useregion[:,1:nx-1:density]))
+
+    return getstats(dat.T, plan.getscales(), ny, mult, resolution)
+
+################################################################
+def processtiles( item, density, resolution, window, overlap, numproc, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8 ):
+    """
+    grain size map: runs the analysis over a grid of overlapping square
+    windows across the whole image (not just the central box)
+    returns the window centres and maps of mean grain size and sorting
+    """
+    # an image which cannot be read raises IOError, for the batch driver to deal with
+    region = readimage(item, band)
+    nx, ny = np.shape(region)
+    if window>min(nx, ny) or not 0<=overlap<window:
+        raise ValueError('windows of '+str(window)+' pixels overlapping by '+str(overlap)+' do not fit in an image of '+str(ny)+' x '+str(nx)+' pixels')
+
+    # flatten the whole image once, rather than window by window
+    useregion = flatten(region)
+
+    step = window-overlap
+    rows = range(0,nx-window+1,step)
+    cols = range(0,ny-window+1,step)
+
+    # each task is a row of windows
+    percolumns = len(cols)*len(range(1,window-1,density))
+    scales = scalerange(sizes, resolution)
+    numproc, chunk = workers(waveletplan(window, wavelet, notes, 'fast', scales), len(rows)*percolumns, numproc, executor, percolumns)
+
+    print('analysing ',len(rows)*len(cols),' windows of ',window,' pixels')
+    d = execute( tiletask, rows, numproc, executor, inittiles, (region, useregion, cols, density, resolution, window, scales, wavelet, notes) )
+
+    mnsz = np.array([t[0] for t in d])
+    srt = np.array([t[1] for t in d])
+    rc = np.asarray(rows)+window//2
+    cc = np.asarray(cols)+window//2
+    return rc, cc, mnsz, srt
+
+################################################################
+def inittiles( region, useregion, cols, density, resolution, window, scales=None, wavelet='morlet', notes=8 ):
+    """
+    worker initialiser for grain size maps: the worker's state, which keeps
+    the image, flattened and not, and the settings, for its lifetime
+    """
+    return {'region': region, 'useregion': useregion, 'cols': cols,
+            'density': density, 'resolution': resolution, 'window': window,
+            'scales': scales, 'wavelet': wavelet, 'notes': notes}
+
+################################################################
+def tiletask(w, r):
+   # the row of windows starting at row r of the worker's image
+   window = w['window']
+   return tilerow( w['region'][r:r+window,:], w['useregion'][r:r+window,:], w['cols'], w['density'], w['resolution'], window, w['scales'], w['wavelet'], w['notes'] )
+
+################################################################
+def tilerow( region, useregion, cols, density, resolution, window, scales=None, wavelet='morlet', notes=8 ):
+    """
+    analyse one row of windows: every window has the same size so they all
+    share one plan, and their columns are transformed together as one block
+    scales is the range of scales to transform (see scalerange) [all]
+    """
+    # same wavelet settings as processimage
+    plan = waveletplan(window, wavelet, notes, 'fast', scales)
+
+    ks = np.arange(1,window-1,density)
+    index = (np.tile(np.asarray(cols),(len(ks),1)).T + ks).flatten()
+    dat = plan.transform(plan.prepare(useregion[:,index]))
+    dat = np.reshape(dat, (len(cols),len(ks),-1))
+
+    mnsz = np.zeros(len(cols))
+    srt = np.zeros(len(cols))
+    levels = depth(region)
+    for i in range(len(cols)):
+        box = region[:,cols[i]:cols[i]+window]
+        if np.ptp(box)==0:
+           # featureless window
+           mnsz[i] = np.nan; srt[i] = np.nan
+           continue
+        mult = getmult(box, levels)
+        sz, pdf, mnsz[i], srt[i], sk, kurt = getstats(dat[i].T, plan.getscales(), window, mult, resolution)
+    return mnsz, srt
+
+################################################################
+def writetiles( item, rc, cc, mnsz, srt, window ):
+    """
+    writes grain size maps to file
+    one row per row of windows; window centres (pixels) in the header
+    """
+    header = 'window: '+str(window)+' pixels\nrow centres: '+' '.join(map(str,rc))+'\ncolumn centres: '+' '.join(map(str,cc))
+
+    with open(item+'_mnsz_map.txt', 'w') as f:
+     np.savetxt(f, mnsz, delimiter=', ', fmt='%s', header=header, comments='% ')
+    print('mean grain size map saved to ',item,'_mnsz_map.txt')
+
+    with open(item+'_srt_map.txt', 'w') as f:
+     np.savetxt(f, srt, delimiter=', ', fmt='%s', header=header, comments='% ')
+    print('sorting map saved to ',item,'_srt_map.txt')
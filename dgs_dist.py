@@ -0,0 +1,504 @@
+# dgs_dist.py
+# wavelet-based digital grain size analysis, distributed over several machines
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_DIST.PY
+ {D}IGITAL {G}RAIN {S}IZE - {WAV}ELET, distributed
+ Runs the dgs_wav_p.py analysis of a folder of images on any number of
+ machines at once, without splitting the folder up by hand. Every machine
+ runs this same command; each one claims the next image from a shared
+ work queue, analyses it with processimage, writes the usual outputs with
+ writeout, and marks it done
+
+ The queue is a folder on storage all the machines can see, with one small
+ file per image, moved between the folders todo, leased, done and failed.
+ Claiming an image is an atomic rename from todo to leased, so two machines
+ can never claim the same one. While a machine works on an image it keeps
+ touching the lease file; if it stops (the machine died or was switched
+ off) the lease runs out and the image goes back to todo for someone else.
+ When there is nothing left to claim, idle machines also take a backup copy
+ of any image that has been leased for a long time (a straggler), and
+ whichever copy finishes first counts; if one copy fails, the other is
+ left to finish, and only the last to fail gives the image back
+
+ REQUIRED INPUTS:
+ folder e.g. '/shared/my_sediment_images' (the same path on every machine)
+ queue  e.g. '/shared/dgs_queue'
+
+ OPTIONAL INPUTS [default values]
+ density = process every density lines of image [10]
+ doplot = 0=no, 1=yes [0]
+ render = draw the plots on this machine, 0=no, 1=yes [0]: every machine
+          saves what its plots need (doplot=1), and the one machine given
+          render=1 draws them all, until the queue is finished
+ resolution = spatial resolution of image in mm/pixel [1]
+ numproc = number of processors on this machine, or auto to suit each image and the machine [4]
+ lease = seconds without a heartbeat before an image is given to another machine [300]
+ straggle = seconds after which idle machines take a backup copy of a leased image, 0=never [3600]
+ tries = number of machines to try an image on before giving up on it [3]
+ nboot = number of bootstrap resamples, for 95% confidence intervals on the statistics [none]
+ executor = how the columns of an image are spread over the processors (see dgs_core.py) [auto]
+ band = band of colour images to analyse (0, 1, 2 ...) [none: their luminance]
+ sizes = smallest,largest grain size (mm) to look for; either may be left out [none: all sizes]
+ wavelet = wavelet family: morlet, paul or dog, optionally with its order, e.g. dog4 [morlet]
+ notes = scales per octave [8]
+ store = folder of a results store (see dgs_store.py), one for each machine, not shared [none]
+
+ OUTPUTS:
+ as dgs_wav_p.py, next to each image, and the queue folder, in which
+ done/ and failed/ list what has been analysed and what could not be
+
+ EXAMPLE:
+ on each machine
+ python dgs_dist.py -f /shared/my_sediment_images -q /shared/dgs_queue -n 8
+
+ with plots, drawn by the first machine only
+ python dgs_dist.py -f /shared/my_sediment_images -q /shared/dgs_queue -n 8 -p 1 -w 1
+ python dgs_dist.py -f /shared/my_sediment_images -q /shared/dgs_queue -n 8 -p 1
+'''
+
+from __future__ import division, print_function
+import sys, getopt, os, time, json, hashlib, socket, threading
+from dgs_core import processimage, writeout, executors, getwavelet
+from dgs_plot import Renderer
+from dgs_io import listimages
+from dgs_fft import shareworkers
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def taskname(item):
+    """
+    name of the queue entry for an item: a hash of its path
+    """
+    if not isinstance(item, bytes):
+        item = item.encode('utf-8')
+    return hashlib.md5(item).hexdigest()
+
+################################################################
+class FileQueue:
+    """
+    Work queue kept as files in a folder on shared storage
+    one file per item, named by a hash of the item, in one of the
+    sub folders todo, leased, done, failed
+    """
+
+################################################################
+    def __init__(self, folder, lease=300, straggle=3600, tries=3):
+        self.folder = folder
+        self.lease = lease
+        self.straggle = straggle
+        self.tries = tries
+        for state in ['todo','leased','done','failed','backup']:
+            if os.path.isdir(folder+os.sep+state)==False:
+                try:
+                    os.makedirs(folder+os.sep+state)
+                except OSError:
+                    # another machine made it first
+                    pass
+
+################################################################
+    def _path(self, state, name):
+        return self.folder+os.sep+state+os.sep+name
+
+################################################################
+    def _read(self, state, name):
+        with open(self._path(state,name)) as f:
+            return json.load(f)
+
+################################################################
+    def _write(self, state, name, task):
+        """
+        rewrite an item's file, only if it is still there: returns False if
+        another machine has moved it on (it is never made again here)
+        """
+        try:
+            f = open(self._path(state,name),'r+')
+        except IOError:
+            return False
+        with f:
+            json.dump(task, f)
+            f.truncate()
+        return True
+
+################################################################
+    def _unbackup(self, name):
+        try:
+            os.remove(self._path('backup',name))
+        except OSError:
+            pass
+
+################################################################
+    def add(self, items):
+        """
+        add items which are not already in the queue (in any state)
+        returns the number added
+        """
+        count = 0
+        for item in items:
+            name = taskname(item)
+            if any([os.path.exists(self._path(state,name)) for state in ['todo','leased','done','failed']]):
+                continue
+            try:
+                fd = os.open(self._path('todo',name), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                continue
+            os.write(fd, json.dumps({'item': item, 'attempts': 0}).encode('utf-8'))
+            os.close(fd)
+            count = count+1
+        return count
+
+################################################################
+    def claim(self, worker):
+        """
+        claim the next item: returns (name, item), or None if there is nothing to claim
+        """
+        for name in sorted(os.listdir(self.folder+os.sep+'todo')):
+            try:
+                os.rename(self._path('todo',name), self._path('leased',name))
+                # the lease runs from now, not from when the item was added
+                os.utime(self._path('leased',name), None)
+            except OSError:
+                # claimed by someone else first
+                continue
+            try:
+                task = self._read('leased',name)
+            except (IOError, ValueError):
+                # put back by another machine's reclaim meanwhile
+                continue
+            task['worker'] = worker
+            task['claimed'] = time.time()
+            task['attempts'] = task['attempts']+1
+            task.pop('holderfailed', None)
+            if not self._write('leased',name,task):
+                continue
+            return name, task['item']
+        return self.backup(worker)
+
+################################################################
+    def backup(self, worker):
+        """
+        claim a backup copy of the longest running leased item, if it has run
+        longer than straggle seconds and nobody has a backup of it already
+        """
+        if not self.straggle:
+            return None
+        oldest = None
+        for name in os.listdir(self.folder+os.sep+'leased'):
+            try:
+                task = self._read('leased',name)
+            except (IOError, ValueError):
+                continue
+            if time.time()-task.get('claimed',time.time()) > self.straggle and task.get('worker')!=worker:
+                if oldest is None or task['claimed'] < oldest[1]['claimed']:
+                    oldest = (name, task)
+        if oldest is None:
+            return None
+        try:
+            # a lock file, so only one machine takes the backup
+            os.close(os.open(self._path('backup',oldest[0]), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError:
+            return None
+        return oldest[0], oldest[1]['item']
+
+################################################################
+    def renew(self, name):
+        """
+        heartbeat: extend the lease on an item; False if it has been lost
+        """
+        try:
+            os.utime(self._path('leased',name), None)
+            return True
+        except OSError:
+            return False
+
+################################################################
+    def complete(self, name):
+        """
+        mark an item done (by whichever copy finishes first)
+        """
+        for state in ['leased','todo']:
+            try:
+                os.rename(self._path(state,name), self._path('done',name))
+                break
+            except OSError:
+                pass
+        if os.path.exists(self._path('backup',name)):
+            try:
+                os.remove(self._path('backup',name))
+            except OSError:
+                pass
+
+################################################################
+    def fail(self, name, reason, worker=None):
+        """
+        give an item back for another try elsewhere, or after tries attempts,
+        mark it failed; but while another copy of it is still running (the
+        lease holder's, or a backup), leave that copy to finish it
+        """
+        try:
+            task = self._read('leased',name)
+        except (IOError, ValueError):
+            return
+        holder = worker is None or task.get('worker')==worker
+        if os.path.exists(self._path('backup',name)):
+            if holder:
+                # the backup copy carries on, and gives the item back if it fails too
+                task['reason'] = reason
+                task['holderfailed'] = True
+                self._write('leased',name,task)
+                return
+            if not task.get('holderfailed'):
+                # the lease holder carries on; another machine may back it up again
+                self._unbackup(name)
+                return
+        task['reason'] = reason
+        if not self._write('leased',name,task):
+            # its lease ran out, and it is back in the queue already
+            return
+        state = 'failed' if task['attempts'] >= self.tries else 'todo'
+        try:
+            os.rename(self._path('leased',name), self._path(state,name))
+        except OSError:
+            pass
+        self._unbackup(name)
+
+################################################################
+    def reclaim(self):
+        """
+        put items whose lease has run out back in todo
+        """
+        for name in os.listdir(self.folder+os.sep+'leased'):
+            try:
+                if time.time()-os.path.getmtime(self._path('leased',name)) > self.lease:
+                    os.rename(self._path('leased',name), self._path('todo',name))
+                    # nobody is running it any more, backup or not
+                    self._unbackup(name)
+                    print('lease on ',name,' ran out; back in the queue')
+            except OSError:
+                pass
+
+################################################################
+    def counts(self):
+        """
+        number of items in each state
+        """
+        return dict([(state, len(os.listdir(self.folder+os.sep+state))) for state in ['todo','leased','done','failed']])
+
+################################################################
+    def finished(self):
+        c = self.counts()
+        return c['todo']==0 and c['leased']==0
+
+################################################################
+def heartbeat(queue, name, stop, interval):
+    """
+    keep renewing the lease on name until stop is set
+    """
+    while not stop.wait(interval):
+        if not queue.renew(name):
+            return
+
+################################################################
+def runworker( queue, worker, density, doplot, resolution, folder, numproc, nboot=0, executor='auto', band=None, sizes=None, wavelet='morlet', notes=8, store=None ):
+    """
+    claim, analyse and complete items from queue until it is finished; the
+    analysis settings are as for processimage, and store for writeout
+    returns the number of images this worker analysed
+    """
+    count = 0
+    while True:
+        queue.reclaim()
+        claimed = queue.claim(worker)
+        if claimed is None:
+            if queue.finished():
+                return count
+            # others are still working; wait in case their leases run out
+            time.sleep(min(queue.lease/10., 30))
+            continue
+
+        name, item = claimed
+        print("===========================================")
+        print("Analysing "+item+" on "+worker)
+
+        stop = threading.Event()
+        beat = threading.Thread(target=heartbeat, args=(queue, name, stop, queue.lease/3.))
+        beat.daemon = True
+        beat.start()
+        try:
+            sz, pdf, mnsz, srt, sk, kurt, ci = processimage( item, density, doplot, resolution, folder, numproc, nboot, executor, band, sizes, wavelet, notes )
+            writeout( item, sz, pdf, mnsz, srt, sk, kurt, resolution, ci, store )
+            queue.complete(name)
+            count = count+1
+        except Exception as e:
+            print('failed: ', item)
+            queue.fail(name, repr(e), worker)
+        finally:
+            stop.set()
+            beat.join()
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   start = time.time()
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("=========DISTRIBUTED BATCH WORKER==========")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   folder = ''; queuedir = ''
+   density = ''; doplot = ''
+   resolution = ''; numproc = ''
+   lease = ''; straggle = ''
+   tries = ''; nboot = ''
+   executor = ''; band = ''
+   sizes = ''; wavelet = ''
+   notes = ''; store = ''
+   render = ''
+
+   usage = 'dgs_dist.py -f <folder> -q <queue folder> [[-d <density> -p < doplot (0=no, 1=yes)> -r <resolution (mm/pixel)> -n <number of processors> -l <lease (s)> -s <straggler time (s)> -t <tries> -u <bootstrap resamples> -e <executor (auto, thread, process, joblib, inline)> -c <band> -g <smallest,largest grain size (mm)> -m <wavelet (morlet, paul, dog)> -v <notes per octave> -a <results store, on this machine> -w <draw the plots on this machine (0=no, 1=yes)> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hf:q:d:p:r:n:l:s:t:u:e:c:g:m:v:a:w:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-f"):
+         folder = arg
+      elif opt in ("-q"):
+         queuedir = arg
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-p"):
+         doplot = arg
+      elif opt in ("-r"):
+         resolution = arg
+      elif opt in ("-n"):
+         numproc = arg
+      elif opt in ("-l"):
+         lease = arg
+      elif opt in ("-s"):
+         straggle = arg
+      elif opt in ("-t"):
+         tries = arg
+      elif opt in ("-u"):
+         nboot = arg
+      elif opt in ("-e"):
+         executor = arg
+      elif opt in ("-c"):
+         band = arg
+      elif opt in ("-g"):
+         sizes = arg
+      elif opt in ("-m"):
+         wavelet = arg
+      elif opt in ("-v"):
+         notes = arg
+      elif opt in ("-a"):
+         store = arg
+      elif opt in ("-w"):
+         render = arg
+
+   # exit program if no input folder or queue given
+   if not folder or not queuedir:
+      print('A folder and a queue folder are required!!!!!!')
+      print(usage)
+      sys.exit(2)
+
+   density = int(density) if density else 10
+   doplot = int(doplot) if doplot else 0
+   resolution = float(resolution) if resolution else 1
+   numproc = (numproc if numproc=='auto' else int(numproc)) if numproc else 4
+   lease = float(lease) if lease else 300
+   straggle = float(straggle) if straggle else 3600
+   tries = int(tries) if tries else 3
+   nboot = int(nboot) if nboot else 0
+   executor = executor if executor else 'auto'
+   band = int(band) if band else None
+   wavelet = wavelet if wavelet else 'morlet'
+   notes = int(notes) if notes else 8
+   store = store if store else None
+   render = int(render) if render else 0
+
+   if executor not in executors:
+      print('executor must be one of '+', '.join(sorted(executors)))
+      sys.exit(2)
+   try:
+      getwavelet(wavelet)
+   except ValueError as e:
+      print(e)
+      sys.exit(2)
+   if sizes:
+      sizes = sizes.split(',')
+      if len(sizes)!=2:
+         print('sizes must be given as smallest,largest (mm)')
+         sys.exit(2)
+      sizes = tuple([float(s) if s else None for s in sizes])
+   else:
+      sizes = None
+
+   print('Input folder is ', folder)
+   print('Queue folder is ', queuedir)
+   print('Density is '+str(density)+', resolution is '+str(resolution)+' mm/pixel, '+str(numproc)+' processors')
+   print('Leases last '+str(lease)+' s; stragglers are backed up after '+str(straggle)+' s')
+   print('Wavelet is '+wavelet+', '+str(notes)+' scales per octave; executor is '+executor)
+
+   # if make plot
+   if doplot:
+      if os.path.isdir(folder+os.sep+"outputs")==False:
+         try:
+            os.mkdir(folder+os.sep+"outputs")
+         except OSError:
+            pass
+
+   # cover all major file types
+   files = listimages(folder)
+
+   # every machine adds the folder; images already in the queue are left alone
+   queue = FileQueue(queuedir, lease, straggle, tries)
+   print(str(queue.add(files))+' images added to the queue')
+
+   # numproc processes share the processors for their Fourier transforms
+   if numproc!='auto':
+      shareworkers(numproc)
+
+   worker = socket.gethostname()+'-'+str(os.getpid())
+   # plots are drawn in the background, as their images are done, by one
+   # machine only (others would draw the same plots at the same time)
+   if doplot and render:
+      renderer = Renderer(folder)
+
+   count = runworker( queue, worker, density, doplot, resolution, folder, numproc, nboot, executor, band, sizes, wavelet, notes, store )
+
+   if doplot and render:
+      print('finishing plots')
+      renderer.finish()
+
+   print("===========================================")
+   elapsed = (time.time() - start)
+   print("Processing took ", elapsed , "seconds to analyse ", count, "images on "+worker)
+   print(queue.counts())
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
@@ -0,0 +1,222 @@
+# dgs_fft.py
+# fast Fourier transforms for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_FFT.PY
+ All the Fourier transforms in the analysis go through here, so that the
+ fastest library installed is used:
+
+ 1) pyFFTW (FFTW), multithreaded, with plans cached in memory and the
+    'wisdom' FFTW learns about this machine saved to ~/.dgs_fftw_wisdom
+    so later runs start with good plans
+ 2) scipy.fft (scipy 1.4 and later), multithreaded
+ 3) numpy.fft, single threaded, if neither of the above is available
+
+ The choice can be forced with the environment variable DGS_FFT
+ (pyfftw, scipy or numpy), and the number of threads set with
+ DGS_FFT_THREADS [all processors]. When the work is already spread over
+ several processes (as in dgs_wav_p.py), use fewer threads in each
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import os, atexit, multiprocessing
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# number of threads for each transform
+try:
+    workers = int(os.environ.get('DGS_FFT_THREADS', multiprocessing.cpu_count()))
+except (ValueError, NotImplementedError):
+    workers = 1
+
+wisdomfile = os.path.expanduser('~'+os.sep+'.dgs_fftw_wisdom')
+
+################################################################
+def _pyfftw():
+    import pyfftw, pyfftw.interfaces.numpy_fft
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(60)
+    try:
+        with open(wisdomfile,'rb') as f:
+            pyfftw.import_wisdom(pickle.load(f))
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+    atexit.register(savewisdom)
+    return pyfftw.interfaces.numpy_fft
+
+################################################################
+def _scipyfft():
+    import scipy.fft
+    # before scipy 1.4, scipy.fft was a function, not this module
+    scipy.fft.next_fast_len
+    return scipy.fft
+
+################################################################
+def savewisdom():
+    """
+    save what FFTW has learnt about transforms on this machine
+    """
+    import pyfftw
+    try:
+        with open(wisdomfile,'wb') as f:
+            pickle.dump(pyfftw.export_wisdom(), f, 2)
+    except IOError:
+        pass
+
+################################################################
+def setworkers(n):
+    """
+    set the number of threads used for each transform
+    """
+    global workers
+    workers = max(1,int(n))
+
+################################################################
+def shareworkers(numproc):
+    """
+    when the work is spread over numproc processes, share the processors
+    between them: sets the number of threads here, and (through DGS_FFT_THREADS)
+    in worker processes started from now on
+    """
+    n = max(1,multiprocessing.cpu_count()//int(numproc))
+    os.environ['DGS_FFT_THREADS'] = str(n)
+    setworkers(n)
+
+# choose the backend, best first
+backend = 'numpy'
+_lib = np.fft
+for name, loader in [('pyfftw',_pyfftw), ('scipy',_scipyfft)]:
+    if os.environ.get('DGS_FFT', name)!=name:
+        continue
+    try:
+        _lib = loader()
+        backend = name
+        break
+    except (ImportError, AttributeError):
+        pass
+
+################################################################
+def fft(a, n=None, axis=-1):
+    """
+    one dimensional discrete Fourier transform (as numpy.fft.fft)
+    """
+    if backend=='pyfftw':
+        return _lib.fft(a, n, axis, threads=workers, planner_effort='FFTW_MEASURE')
+    if backend=='scipy':
+        return _lib.fft(a, n, axis, workers=workers)
+    return np.fft.fft(a, n, axis)
+
+################################################################
+def ifft(a, n=None, axis=-1):
+    """
+    one dimensional inverse discrete Fourier transform (as numpy.fft.ifft)
+    """
+    if backend=='pyfftw':
+        return _lib.ifft(a, n, axis, threads=workers, planner_effort='FFTW_MEASURE')
+    if backend=='scipy':
+        return _lib.ifft(a, n, axis, workers=workers)
+    return np.fft.ifft(a, n, axis)
+
+################################################################
+def rfftn(a, s):
+    """
+    n dimensional discrete Fourier transform of real input (as numpy.fft.rfftn)
+    """
+    if backend=='pyfftw':
+        return _lib.rfftn(a, s, threads=workers, planner_effort='FFTW_MEASURE')
+    if backend=='scipy':
+        return _lib.rfftn(a, s, workers=workers)
+    return np.fft.rfftn(a, s)
+
+################################################################
+def irfftn(a, s):
+    """
+    inverse of rfftn (as numpy.fft.irfftn)
+    """
+    if backend=='pyfftw':
+        return _lib.irfftn(a, s, threads=workers, planner_effort='FFTW_MEASURE')
+    if backend=='scipy':
+        return _lib.irfftn(a, s, workers=workers)
+    return np.fft.irfftn(a, s)
+
+################################################################
+def nextfastlen(n):
+    """
+    smallest length >= n which has no prime factors other than 2, 3 and 5
+    (transforms of these lengths are fast with all the backends)
+    """
+    if n<=6:
+        return max(int(n),1)
+    best = 2**int(np.ceil(np.log2(n)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            # smallest power of 2 times p35 which is >= n
+            p = p35
+            while p < n:
+                p = p*2
+            best = min(best,p)
+            p35 = p35*3
+        p5 = p5*5
+    return best
+
+################################################################
+def fftconvolve(in1, in2, mode='valid', out=None, rows=None):
+    """
+    convolve two n dimensional real arrays using Fourier transforms
+    (as scipy.signal.fftconvolve; modes full and valid)
+    for two dimensional arrays in valid mode, the result can be written
+    into out (e.g. float32), rows of it at a time (see convolverows)
+    """
+    if out is not None or rows is not None:
+        return convolverows(in1, in2, out, rows)
+    in1 = np.asarray(in1, dtype=np.float64)
+    in2 = np.asarray(in2, dtype=np.float64)
+    s1 = np.array(np.shape(in1))
+    s2 = np.array(np.shape(in2))
+    shape = s1+s2-1
+    fshape = [nextfastlen(d) for d in shape]
+    ret = irfftn(rfftn(in1,fshape)*rfftn(in2,fshape),fshape)[tuple([slice(0,d) for d in shape])]
+    if mode=='full':
+        return ret
+    elif mode=='valid':
+        newshape = s1-s2+1
+        start = (shape-newshape)//2
+        return ret[tuple([slice(start[k],start[k]+newshape[k]) for k in range(len(shape))])]
+    else: raise ValueError("mode must be full or valid")
+
+################################################################
+def convolverows(in1, in2, out=None, rows=None):
+    """
+    valid two dimensional convolution, worked out for rows rows of the
+    result at a time (overlap-save), so the transforms are of strips of
+    in1 rather than all of it; in1 may be any real type, and only one strip
+    at a time is converted to float64. The result goes into out, if given
+    """
+    s1 = np.array(np.shape(in1))
+    s2 = np.array(np.shape(in2))
+    newshape = s1-s2+1
+    if out is None:
+        out = np.empty(newshape)
+    rows = int(rows) if rows else newshape[0]
+    # the kernel is transformed once, for strips of rows+s2[0]-1 rows
+    fshape = [nextfastlen(rows+s2[0]-1), nextfastlen(s1[1])]
+    kernel = rfftn(np.asarray(in2, dtype=np.float64), fshape)
+    for r in range(0, newshape[0], rows):
+        n = min(rows, newshape[0]-r)
+        strip = np.asarray(in1[r:r+n+s2[0]-1], dtype=np.float64)
+        ret = irfftn(rfftn(strip, fshape)*kernel, fshape)
+        out[r:r+n] = ret[s2[0]-1:s2[0]-1+n, s2[1]-1:s2[1]-1+newshape[1]]
+    return out
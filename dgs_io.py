@@ -0,0 +1,184 @@
+# dgs_io.py
+# reading images for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_IO.PY
+ Images are read straight into numpy arrays at their own bit depth:
+ 8-bit images stay 8-bit, and 16-bit and floating point images (e.g.
+ thin section scans, as TIFF) keep their full range of grey levels,
+ rather than all going through PIL's convert("L") to 8 bits. Raw arrays
+ saved with numpy (.npy) are read too, memory mapped
+
+ Colour images become one band: either the band chosen (band = 0, 1, 2 ...,
+ which grey images ignore) or their luminance, worked out a block of rows at a time into the output
+ array, with the same weights as PIL (so 8-bit images give exactly the
+ grey levels they always have). 8-bit colour images read by PIL are taken
+ from PIL a block of rows at a time too, so the whole image is never
+ held as a (rows, columns, bands) array as well as by PIL
+
+ If tifffile is installed, TIFFs are read with it, which also reads
+ multi-band 16-bit and floating point TIFFs that PIL cannot
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import os, glob
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+# image file types read from a folder
+extensions = ['JPG','jpg','jpeg','TIF','tif','TIFF','tiff','PNG','png','npy']
+
+# rows converted to luminance at once (bounds the temporary arrays)
+blockrows = 256
+
+# luminance weights: PIL's, in 16-bit fixed point for 8-bit images (ITU-R 601-2)
+_weights8 = np.array([19595, 38470, 7471], np.uint32)
+_weights = np.array([0.299, 0.587, 0.114])
+
+# current Pillow rounds the fixed point luminance to the nearest grey level
+# (adding half of 1<<16 before the shift), older releases truncated it: do
+# as the PIL installed does, so 8-bit images match its convert("L") exactly
+_round8 = int(Image.new('RGB',(1,1),(0,1,0)).convert('L').getpixel((0,0)))*0x8000
+
+################################################################
+def listimages(folder):
+    """
+    the images (of all the types read) in folder
+    """
+    files = []
+    for ext in extensions:
+        files = files+glob.glob(folder+os.sep+"*."+ext)
+    return files
+
+################################################################
+def luminance(a, band=None):
+    """
+    one band image from a (rows, columns[, bands]) array: the band
+    chosen, or the luminance of the first three bands, of the same type
+    (8-bit as with PIL's convert("L"); floating point becomes float32)
+    """
+    if np.ndim(a)==2:
+        # already one band, whichever was asked for
+        return a
+    if band is not None:
+        return np.ascontiguousarray(a[:,:,band])
+    if np.shape(a)[2]<3:
+        # grey with alpha
+        return np.ascontiguousarray(a[:,:,0])
+
+    integer = np.issubdtype(a.dtype, np.integer)
+    out = np.empty(np.shape(a)[:2], a.dtype if integer else np.float32)
+    for i in range(0,len(a),blockrows):
+        block = a[i:i+blockrows,:,:3]
+        if a.dtype==np.uint8:
+            out[i:i+blockrows] = (np.dot(block,_weights8)+_round8)>>16
+        elif integer:
+            out[i:i+blockrows] = np.dot(block,_weights)+0.5
+        else:
+            out[i:i+blockrows] = np.dot(block,_weights)
+    return out
+
+################################################################
+def pilluminance(im):
+    """
+    luminance (see luminance) of an 8-bit colour PIL image, taken from
+    it a block of rows at a time
+    """
+    width, height = im.size
+    out = np.empty((height, width), np.uint8)
+    for i in range(0,height,blockrows):
+        out[i:i+blockrows] = luminance(np.asarray(im.crop((0, i, width, min(i+blockrows, height)))))
+    return out
+
+################################################################
+def readimage(item, band=None):
+    """
+    image (file name, open file, or numpy array) as a numpy array of one
+    band (see luminance), at its own bit depth
+    an image which cannot be read raises IOError
+    """
+    if isinstance(item, np.ndarray):
+        return luminance(item, band)
+    name = item if isinstance(item, basestring) else ''
+    ext = os.path.splitext(name)[1].lower()
+    if ext=='.npy':
+        try:
+            a = np.load(name, mmap_mode='r')
+        except ValueError as e:
+            raise IOError(str(e))
+        return luminance(a, band)
+    if ext in ('.tif','.tiff') and tifffile is not None:
+        try:
+            return luminance(tifffile.imread(name), band)
+        except ValueError as e:
+            raise IOError(str(e))
+
+    im = Image.open(item)
+    if im.mode in ('1','P','PA'):
+        im = im.convert('RGBA' if im.mode=='PA' else 'L')
+    if band is not None and len(im.getbands())>1:
+        return np.asarray(im.split()[band])
+    if im.mode in ('CMYK','YCbCr','LAB','HSV'):
+        im = im.convert('RGB')
+    if im.mode in ('RGB','RGBA'):
+        return pilluminance(im)
+    a = np.asarray(im)
+    if im.mode=='I' and np.min(a)>=0 and np.max(a)<=65535:
+        # PIL reads 16-bit PNGs (and some TIFFs) as 32-bit integers
+        a = a.astype(np.uint16)
+    return luminance(a, band)
+
+################################################################
+def imagesize(item):
+    """
+    (width, height) of an image file, from its header only
+    """
+    if os.path.splitext(item)[1].lower()=='.npy':
+        shape = np.load(item, mmap_mode='r').shape
+        return shape[1], shape[0]
+    return Image.open(item).size
+
+################################################################
+def depth(a):
+    """
+    full range of grey levels of an image: 255 for 8-bit, 65535 for
+    16-bit, and for floating point 1 (if its values are from 0 to 1)
+    or else the range of its values
+    """
+    if np.issubdtype(a.dtype, np.integer):
+        return float(np.iinfo(a.dtype).max)
+    lo, hi = float(np.min(a)), float(np.max(a))
+    if lo>=0 and hi<=1:
+        return 1.0
+    return hi-lo if hi>lo else 1.0
+
+################################################################
+def eightbit(a):
+    """
+    image as 8-bit (e.g. for display), scaled by its depth
+    """
+    if a.dtype==np.uint8:
+        return a
+    lo = 0 if np.issubdtype(a.dtype, np.integer) else np.min(a)
+    return np.uint8(np.clip((a-lo)*(255./depth(a)),0,255))
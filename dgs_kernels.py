@@ -0,0 +1,114 @@
+# dgs_kernels.py
+# compiled inner loops for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_KERNELS.PY
+ The element by element work between the Fourier transforms in
+ Plan.transform (see dgs_plan.py), for a block of columns at one scale:
+
+ filtered: multiply the transformed columns by the wavelet filter
+ power:    single precision magnitude squared of the wavelet coefficients,
+           divided by the scale, written into the (zero padded) block to be
+           smoothed
+ smoothed: multiply the transformed power by the gaussian smoothing kernel
+ realvar:  variance of the real part of the smoothed power of each column
+
+ If numba is installed, these are compiled, with the columns spread over
+ all processors and each step done in one pass over memory; otherwise
+ numpy is used, with the same results. The choice can be forced with the
+ environment variable DGS_KERNELS (numba or numpy)
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import os
+
+################################################################
+############## NUMPY ###########################################
+################################################################
+
+def _npfiltered(datahat, psihat, out):
+    np.multiply(psihat, datahat, out)
+
+def _nppower(cwt, ny, scale, out):
+    out[:,:ny] = (1/scale)*(np.absolute(cwt[:,:ny].astype(np.complex64))**2).astype(np.float64)
+
+def _npsmoothed(F, smooth):
+    F *= smooth
+
+def _nprealvar(Z, ny, out):
+    out[:] = np.var(Z[:,:ny].real,axis=1)
+
+################################################################
+############## NUMBA ###########################################
+################################################################
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+if numba is not None:
+    jit = numba.njit(parallel=True, cache=True)
+
+    @jit
+    def _nbfiltered(datahat, psihat, out):
+        for i in numba.prange(datahat.shape[0]):
+            for j in range(datahat.shape[1]):
+                out[i,j] = psihat[j]*datahat[i,j]
+
+    @jit
+    def _nbpower(cwt, ny, scale, out):
+        s = 1/scale
+        for i in numba.prange(cwt.shape[0]):
+            for j in range(ny):
+                a = abs(np.complex64(cwt[i,j]))
+                out[i,j] = s*np.float64(a*a)
+
+    @jit
+    def _nbsmoothed(F, smooth):
+        for i in numba.prange(F.shape[0]):
+            for j in range(F.shape[1]):
+                F[i,j] = F[i,j]*smooth[j]
+
+    @jit
+    def _nbrealvar(Z, ny, out):
+        for i in numba.prange(Z.shape[0]):
+            m = 0.
+            for j in range(ny):
+                m += Z[i,j].real
+            m = m/ny
+            v = 0.
+            for j in range(ny):
+                d = Z[i,j].real-m
+                v += d*d
+            out[i] = v/ny
+
+################################################################
+def use(name):
+    """
+    use the numba or numpy kernels
+    raises ImportError if numba is asked for but is not installed
+    """
+    global backend, filtered, power, smoothed, realvar
+    if name=='numba':
+        if numba is None:
+            raise ImportError("numba is not installed")
+        filtered, power, smoothed, realvar = _nbfiltered, _nbpower, _nbsmoothed, _nbrealvar
+    elif name=='numpy':
+        filtered, power, smoothed, realvar = _npfiltered, _nppower, _npsmoothed, _nprealvar
+    else: raise ValueError("kernels must be numba or numpy")
+    backend = name
+
+# choose the kernels, compiled if possible
+if numba is not None and os.environ.get('DGS_KERNELS', 'numba')=='numba':
+    use('numba')
+else:
+    use('numpy')
@@ -0,0 +1,186 @@
+# dgs_plan.py
+# precomputed transform plans for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_PLAN.PY
+ Everything the column loop of processimage recomputes for every column
+ depends only on the column length and the wavelet settings: the padded
+ lengths, the scales, the wavelet filter at each scale and the gaussian
+ smoothing kernel at each scale. A Plan holds these once, and transforms
+ a whole block of columns at a time. Plans are cached by getplan, so all
+ columns, windows and images of the same size share one.
+
+ Columns are zero padded to a length which is fast to transform (no prime
+ factors but 2, 3 and 5) rather than to a power of 2, which can be up to
+ 4 times as long as the column; the scales are still set from the power
+ of 2 length, so they are unchanged. pad='pow2' gives the original lengths,
+ and the same numbers as the original column loop in dgs_wav.py /
+ dgs_wav_p.py; dgs_validate.py compares the two
+
+ A plan can be limited to a range of scales (e.g. from the grain sizes
+ expected), which are then the only ones transformed and smoothed, and
+ only those below ny/3 (the largest grain size reported). The others are
+ left as zero, so the statistics are those of that range of grain sizes
+'''
+
+from __future__ import division, print_function
+import numpy as np
+from dgs_fft import fft, ifft, nextfastlen
+import dgs_kernels as kernels
+
+# plans already built in this process, keyed by getplan's arguments
+_plans = {}
+
+################################################################
+def padlengths(ny, pad='fast'):
+    """
+    lengths for columns of length ny: the length the scales are set
+    from, the length columns are zero padded to for the wavelet transform,
+    and the length of the transform used for smoothing
+    pad is 'fast' (a fast length) or 'pow2' (the next power of 2 but one)
+    """
+    # scales are always set from the next power of 2 but one
+    base2 = np.fix(np.log(ny)/np.log(2) + 0.4999)
+    scalelength = int(2**(base2+1))
+    if pad=='pow2':
+        nfft = scalelength
+    elif pad=='fast':
+        # a quarter of a column of zeros keeps the largest scales used
+        # (up to ny/3) from wrapping round; the length must be even
+        nfft = 2*nextfastlen(int(np.ceil(1.25*ny/2.)))
+    else: raise ValueError("pad must be fast or pow2")
+    # the smoothing kernels are defined on this power of 2 grid, so it is
+    # kept with both (shorter lengths change the smoothing, and the statistics)
+    l2nx = np.ceil( np.log(float(ny))/ np.log(2.0)+0.0001 )
+    npad = int(2**l2nx)
+    return scalelength, nfft, npad
+
+################################################################
+def getplan(ny, wavelet, maxscale, notes, scaling, pad='fast', scalerange=None, order=None):
+    """
+    return the (cached) Plan for columns of length ny
+    """
+    key = (int(ny), wavelet, maxscale, notes, scaling, pad, scalerange, order)
+    if key not in _plans:
+        _plans[key] = Plan(ny, wavelet, maxscale, notes, scaling, pad, scalerange, order)
+    return _plans[key]
+
+################################################################
+class Plan:
+    """
+    Precomputed wavelet filter bank and smoothing kernels for columns of length ny
+    wavelet is a Cwt subclass (e.g. Morlet), of order if it has orders
+    (None for its usual one)
+    scalerange is (smallest, largest) scale to compute, in pixels (either
+    may be None), or None for all of them
+    """
+
+################################################################
+    def __init__(self, ny, wavelet, maxscale, notes, scaling, pad='fast', scalerange=None, order=None):
+        self.ny = ny = int(ny)
+        self.wavelet = wavelet
+        self.order = order
+        self.maxscale = maxscale
+        self.notes = notes
+        self.scaling = scaling
+        self.pad = pad
+        self.scalerange = scalerange
+
+        # length the scales are set from, length each column is zero padded
+        # to before the wavelet transform, and length of the smoothing transform
+        self.scalelength, self.nfft, self.npad = padlengths(ny, pad)
+
+        # the wavelet instance is only used for its scales and wf
+        cw = wavelet(np.zeros(self.nfft),maxscale,notes,order,scaling=scaling,scalelength=self.scalelength)
+        self.scales = cw.getscales()
+        self.nscale = cw.getnscale()
+
+        # the scales transformed (indices into scales)
+        use = np.ones(self.nscale, bool)
+        if scalerange is not None:
+            smallest, largest = scalerange
+            use = self.scales<ny//3
+            if smallest is not None: use = use & (self.scales>=smallest)
+            if largest is not None: use = use & (self.scales<=largest)
+            if not np.any(use):
+                raise ValueError("no scales in the range "+str(scalerange))
+        self.active = np.nonzero(use)[0]
+
+        # wavelet filter bank, as in Cwt.__init__, all scales at once
+        ndata = self.nfft
+        omega = np.array(list(range(0,ndata//2))+list(range(-ndata//2,0)))*(2.0*np.pi/ndata)
+        s = self.scales[self.active][:,np.newaxis]
+        self.psihat = np.zeros((len(self.active),ndata), np.complex128)
+        self.psihat[:] = cw.wf(omega*s) * np.sqrt(2.0*np.pi*s)
+
+        # least squares straight line fit, as a matrix: the trend of a block
+        # of columns A (ny, ncolumns) is np.dot(self.trend,np.dot(self.fit,A))
+        # (the same line as scipy.signal.detrend, without its copies and reshapes)
+        self.trend = np.vstack((np.arange(1.,ny+1)/ny, np.ones(ny))).T
+        self.fit = np.linalg.pinv(self.trend)
+
+        # gaussian smoothing kernels, one per scale
+        k = np.r_[0.:np.fix(self.npad)/2]
+        k = k*((2.*np.pi)/self.npad)
+        kr = -k[::-1]
+        kr = kr[:(self.npad-1)//2]
+        k2 = np.hstack((0,k,kr))**2
+        self.k2 = k2
+        self.smooth = np.exp(-.5*(np.tile(self.scales[self.active]/1.,(self.npad,1)).T**2)*k2)
+        return
+
+################################################################
+    def getscales(self):
+        """
+        returns array containing scales used in transform
+        """
+        return self.scales
+
+################################################################
+    def prepare(self, A, Y=None):
+        """
+        detrend and zero pad a block of columns
+        A is (ny, ncolumns), e.g. a strided view region[:,1:nx-1:density]
+        returns (ncolumns, nfft), written into Y if it is given
+        """
+        ncol = np.shape(A)[1]
+        if Y is None:
+            Y = np.zeros((ncol,self.nfft))
+        else:
+            Y[:,self.ny:] = 0
+        Y[:,:self.ny] = A.T
+        # all the columns are detrended with one solve
+        Y[:,:self.ny] -= np.dot(np.dot(Y[:,:self.ny],self.fit.T),self.trend.T)
+        return Y
+
+################################################################
+    def transform(self, Y):
+        """
+        wavelet transform, scaled power, smoothing and variance for a block of
+        prepared columns Y (ncolumns, nfft)
+        returns the normalised variance at each scale, (ncolumns, nscale)
+        (zero at scales outside the plan's range)
+        """
+        ny = self.ny
+        datahat = fft(Y,axis=1)
+        dat = np.zeros((np.shape(Y)[0],self.nscale))
+        # work space, reused for every scale (see dgs_kernels.py)
+        conv = np.empty(np.shape(datahat),datahat.dtype)
+        wave = np.zeros((np.shape(Y)[0],self.npad))
+        for row, ii in enumerate(self.active):
+            kernels.filtered(datahat, self.psihat[row,:], conv)
+            # scaled power spectrum of the single precision coefficients
+            # (as stored by Cwt), zero padded for smoothing
+            kernels.power(ifft(conv,axis=1), ny, self.scales[ii], wave)
+            # smooth
+            F = fft(wave,axis=1)
+            kernels.smoothed(F, self.smooth[row,:])
+            kernels.realvar(ifft(F,axis=1), ny, dat[:,ii])
+        return dat/np.tile(np.sum(dat,axis=1),(self.nscale,1)).T
@@ -0,0 +1,240 @@
+# dgs_plot.py
+# plots for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_PLOT.PY
+ Plots (doplot=1) are drawn here, away from the analysis. The analysis
+ only saves what the plot needs, next to where the plot goes: small
+ previews of the image, the central box and a box 5 mean grain sizes
+ across, and the grain size distribution (outputs/<image>_plot.npz). A background
+ process watches the outputs folder and draws each plot
+ (outputs/<image>_res.png) as its results appear, so the next image is
+ analysed meanwhile; this works however the images are analysed (in
+ this process, in child processes with a timeout, on other machines)
+
+ Drawing uses matplotlib's Agg renderer directly (no window is ever
+ opened) and one figure, cleared and reused for every plot
+
+ Run on its own, draws (again) the plots for a folder of images already
+ analysed, without analysing them again
+
+ REQUIRED INPUTS:
+ folder e.g. '/home/my_sediment_images' (plots are in its outputs folder)
+
+ OPTIONAL INPUTS [default values]
+ all = 1 to draw every plot again, 0 only those missing or out of date [0]
+
+ EXAMPLES:
+
+ 1) draw the plots for a folder analysed with doplot=1
+ python dgs_plot.py -f /home/my_sediment_images -a 1
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os, glob
+from multiprocessing import Process, Event
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from dgs_io import eightbit
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+# longest side, in pixels, of the image previews
+previewsize = 512
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def preview(a):
+    """
+    downsampled 8-bit copy of an image (numpy array), for plotting
+    """
+    im = Image.fromarray(eightbit(a))
+    im.thumbnail((previewsize,previewsize), Image.LANCZOS)
+    return np.asarray(im)
+
+################################################################
+def plotname(folder, item):
+    """
+    outputs/<image name> in folder, to which _plot.npz or _res.png is added
+    """
+    (dirName, fileName) = os.path.split(item)
+    (fileBaseName, fileExtension)=os.path.splitext(fileName)
+    return folder+os.sep+"outputs"+os.sep+fileBaseName
+
+################################################################
+def saveplot( item, folder, im, region, scales, svarcwt, mnsz ):
+    """
+    save what the plot of an image needs, for the renderer
+    im is the image, region the central box (numpy arrays)
+    """
+    # a box 5 mean grain sizes across, from the corner of the central box
+    n = max(1,int(mnsz*5))
+    box = region[:n,:n]
+
+    name = plotname(folder, item)
+    # written then renamed, so the renderer never reads half a file
+    with open(name+'_plot.tmp','wb') as f:
+        np.savez(f, image=preview(im), region=preview(region), box=preview(box),
+                 sizes=np.array([a.shape[::-1] for a in [im, region, box]]), scales=scales, svarcwt=svarcwt)
+    os.rename(name+'_plot.tmp', name+'_plot.npz')
+
+################################################################
+def render( cache, png, fig=None ):
+    """
+    draw the plot saved in cache to png, reusing fig if given
+    returns the figure, to be reused for the next plot
+    """
+    if fig is None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+    fig.clf()
+    with np.load(cache) as d:
+        for k, key in enumerate(['image','region','box']):
+            ax = fig.add_subplot(221+k)
+            # axes in pixels of the full size image, as the preview covers it
+            w, h = d['sizes'][k]
+            ax.imshow(d[key],cmap='gray',extent=(0,w,h,0))
+
+        ax = fig.add_subplot(224)
+        ax.set_ylabel('Power')
+        ax.set_xlabel('Period')
+        ax.plot(d['scales'],d['svarcwt'],'g-')
+
+    fig.savefig(png)
+    return fig
+
+################################################################
+def renderfolder( folder, stop=None, redo=False, poll=0.5, maxpoll=8 ):
+    """
+    draw the plot for each result saved in folder/outputs whose plot is
+    missing or older (or all of them, if redo); if stop (an Event) is given,
+    keep watching for new results until it is set
+    results are saved by renaming them into the folder, so the folder is
+    only looked through again once its own time has changed; while it has
+    not, it is looked at less and less often (every poll seconds, doubling
+    up to maxpoll)
+    returns the number of plots drawn
+    """
+    outputs = folder+os.sep+"outputs"
+    fig = None
+    drawn = {}
+    count = 0
+    seen = None
+    wait = poll
+    while True:
+        finished = stop is None or stop.is_set()
+        try:
+            changed = os.path.getmtime(outputs)
+        except OSError:
+            changed = None
+        if finished or changed!=seen:
+            # taken before looking, so a result saved meanwhile is looked for again
+            seen = changed
+            wait = poll
+            for cache in sorted(glob.glob(outputs+os.sep+"*_plot.npz")):
+                png = cache[:-len('_plot.npz')]+'_res.png'
+                try:
+                    mtime = os.path.getmtime(cache)
+                    if drawn.get(cache)==mtime:
+                        continue
+                    if not redo and cache not in drawn and os.path.isfile(png) and os.path.getmtime(png)>=mtime:
+                        drawn[cache] = mtime
+                        continue
+                    fig = render(cache, png, fig)
+                    drawn[cache] = mtime
+                    count = count+1
+                except Exception as e:
+                    # e.g. replaced as we read it; tried again next time round
+                    seen = None
+                    if finished:
+                        print('cannot plot '+cache+': '+str(e))
+        else:
+            wait = min(2*wait, maxpoll)
+        if finished:
+            return count
+        stop.wait(wait)
+
+################################################################
+class Renderer:
+    """
+    Background process drawing the plots for folder while it is analysed
+    """
+
+################################################################
+    def __init__(self, folder):
+        self.stop = Event()
+        self.process = Process(target=renderfolder, args=(folder, self.stop))
+        self.process.start()
+
+################################################################
+    def finish(self):
+        """
+        draw the plots still to do, and wait for them
+        """
+        self.stop.set()
+        self.process.join()
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("=====PLOTS FROM RESULTS ALREADY SAVED======")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   folder = ''; redo = ''
+
+   usage = 'dgs_plot.py -f <folder> [[-a <draw all again (0=no, 1=yes)> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hf:a:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-f"):
+         folder = arg
+      elif opt in ("-a"):
+         redo = arg
+
+   # exit program if no input folder given
+   if not folder:
+      print('A folder is required!!!!!!')
+      sys.exit(2)
+
+   # special case = pwd
+   if folder=='pwd':
+      folder = os.getcwd()
+
+   redo = bool(int(redo)) if redo else False
+
+   count = renderfolder( folder, redo=redo )
+   print(str(count)+' plots drawn in '+folder+os.sep+'outputs')
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
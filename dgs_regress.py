@@ -0,0 +1,407 @@
+# dgs_regress.py
+# regression checks on the results, speed and memory of wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_REGRESS.PY
+ Analyses the example images, and synthetic images of discs of known
+ radius (see dgs_synth.py), as dgs_wav.py does, and compares the results
+ with the golden ones kept in the images/golden folder: the grain size
+ statistics (mean, sorting, skewness, kurtosis, D16, D50, D84) and the
+ grain size distributions (psd), which are the files writeout writes
+ It also checks that colour images become the same grey levels as with
+ PIL's convert("L")
+
+ Each image is analysed in a child process, which reports the time the
+ analysis took and its peak memory (the most the process's resident
+ memory grew by). Times are measured in multiples of a reference time,
+ that of a fixed piece of numpy work timed in the same run, so times
+ recorded on one machine can be checked on another (a CI runner, say)
+ They are compared, with the memory, with those recorded for this Python
+ version in images/golden/timings.txt, which is kept with the goldens
+
+ JPEG libraries decode the example images a little differently (a grey
+ level here and there), as do PIL releases turn colour into grey, so the
+ example images have goldens for each way of decoding them, in a folder
+ of images/golden named after it; the synthetic images are not decoded,
+ and have one set of goldens
+
+ Exits with status 1 if a statistic or distribution differs from the
+ golden one by more than the tolerance, if the mean grain size of the
+ discs does not grow with their radius, or is more than disctolerance
+ (10 %) from the multiple of their diameter such discs give (discmeans,
+ which -g does not change), if an image takes longer, or
+ more memory, than recorded by more than the slowdown, or if there are
+ no goldens, times or memory recorded to check against. Runs offline
+ and needs nothing but the modules the analysis does
+
+ After a change which is meant to change the results, or on a new
+ decoder or Python version, write new goldens with -g (which also
+ records times and memory for this Python version)
+
+ OPTIONAL INPUTS [default values]
+ golden = write new golden results (for this decoder), timings and memory (for this Python version), rather than check them [check]
+ density = process every density lines of image [10]
+ tolerance = largest allowed difference in each statistic, and in the
+             distributions (as a percentage of their peak), in percent [0.01]
+ slowdown = largest allowed increase in time and in peak memory, in percent [50]
+ repeats = number of times each image is analysed; the fastest counts [1]
+           (times are recorded from the best of at least 3, and an image
+           which looks slower is timed again, with the reference, up to 3
+           times before it fails)
+
+ EXAMPLES:
+
+ 1) check the results, speed and memory
+ python dgs_regress.py
+
+ 2) record new goldens, after a change meant to change the results
+ python dgs_regress.py -g
+
+ 3) check, allowing images to take up to twice as long, the best of 3 runs
+ python dgs_regress.py -s 100 -n 3
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os, time, resource, traceback
+from multiprocessing import Process, Pipe
+from dgs_core import processimage, writeout
+import dgs_io
+from dgs_io import listimages, luminance
+from dgs_stats import percentiles
+from dgs_synth import discs
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+# side (pixels) and radii (pixels) of the synthetic images of discs
+discsize = 1024
+radii = [4, 8, 16]
+
+# mean grain size of each image of discs, in diameters of its discs: the
+# analysis measures the length scale of the bed, which for discs laid 1.5
+# times over (see dgs_synth.py) is a few diameters, fewer for bigger discs
+# (these are the means over densities 5 to 20 and several seeds, which
+# differ from them by up to 5 %); and the largest difference allowed from
+# them, in percent, which no change should need
+discmeans = {4: 4.24, 8: 3.36, 16: 2.80}
+disctolerance = 10
+
+# runs timed for the recorded times, and at most for an image which looks slower
+retimes = 3
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def cases( folder ):
+    """
+    the images checked: (name, item) for each example image (a file) and
+    each image of discs (a numpy array)
+    """
+    items = [(os.path.basename(f), f) for f in sorted(set(listimages(folder)))]
+    return items+[('discs_r'+str(r), discs(discsize, r)) for r in radii]
+
+################################################################
+def decoder():
+    """
+    how PIL decodes the example images: the JPEG library (and its version)
+    and whether colour becomes grey levels rounded or truncated (see dgs_io.py),
+    as a folder name
+    """
+    return 'libjpeg_'+str(getattr(Image.core,'jpeglib_version','unknown'))+('_rounded' if dgs_io._round8 else '_truncated')
+
+################################################################
+def calibrate():
+    """
+    reference time (s) on this machine: the best of 3 runs of a fixed
+    piece of numpy work, Fourier transforms and array arithmetic as in
+    the analysis (times are recorded as multiples of it)
+    """
+    x = np.random.RandomState(0).standard_normal((256, 4096))
+    best = np.inf
+    for i in range(3):
+        t = time.time()
+        for j in range(4):
+            y = np.fft.irfft(np.fft.rfft(x, axis=1)*0.5, n=4096, axis=1)
+            y = np.sqrt(y*y+x*x)
+        best = min(best, time.time()-t)
+    return best
+
+################################################################
+def checkluminance():
+    """
+    number of pixels of a random 8-bit colour image whose luminance (see
+    dgs_io.py) differs from PIL's convert("L")
+    """
+    rgb = np.random.RandomState(0).randint(0, 256, (256, 256, 3)).astype(np.uint8)
+    grey = np.asarray(Image.fromarray(rgb, 'RGB').convert('L'))
+    return int(np.sum(luminance(rgb)!=grey))
+
+################################################################
+def maxrss(who=resource.RUSAGE_SELF):
+    """
+    peak resident memory of this process so far (or of the largest of its
+    finished child processes, e.g. workers), in MB
+    """
+    return resource.getrusage(who).ru_maxrss/1024.
+
+################################################################
+def measured( item, density, resolution, numproc, executor, wavelet, notes, conn ):
+    """
+    child process: analyse one image and send back the results, the
+    time taken and how much the peak memory grew by (plus the peak of
+    the largest worker process, if any)
+    """
+    try:
+        start = maxrss()
+        t = time.time()
+        scales, pdf, mnsz, srt, sk, kurt, ci = processimage( item, density, 0, resolution, '', numproc, 0, executor, wavelet=wavelet, notes=notes )
+        seconds = time.time()-t
+        memory = maxrss()-start+maxrss(resource.RUSAGE_CHILDREN)
+        conn.send(('ok', (scales, pdf, mnsz, srt, sk, kurt), seconds, memory))
+    except Exception:
+        conn.send(('failed', traceback.format_exc().strip().split('\n')[-1], 0, 0))
+    conn.close()
+
+################################################################
+def runcase( item, density, resolution, numproc=1, executor='inline', wavelet='morlet', notes=8 ):
+    """
+    analyse one image in a child process, as dgs_wav.py does (or as
+    dgs_wav_p.py does, with numproc and executor), with the named wavelet
+    and notes per octave (see waveletplan in dgs_core.py)
+    returns (scales, pdf, mnsz, srt, sk, kurt), time (s) and peak memory (MB)
+    """
+    parent, child = Pipe(False)
+    p = Process(target=measured, args=(item, density, resolution, numproc, executor, wavelet, notes, child))
+    p.start()
+    child.close()
+    try:
+        status, result, seconds, memory = parent.recv()
+    except EOFError:
+        status, result = 'failed', 'analysis process died'
+    p.join()
+    if status!='ok':
+        raise RuntimeError(result)
+    return result, seconds, memory
+
+################################################################
+def readsummary( name ):
+    """
+    mean, sorting, skewness, kurtosis, D16, D50 and D84 from a summary
+    file written by writeout
+    """
+    with open(name+'_summary.txt') as f:
+        lines = [l for l in f if not l.startswith('%')]
+    # resolution, then a line for each moment, then the percentiles
+    return np.array([float(l) for l in lines[1:5]]+[float(d) for d in lines[5].split(',')])
+
+################################################################
+def readpsd( name ):
+    """
+    grain sizes and distribution from a psd file written by writeout
+    """
+    sz, pdf = np.loadtxt(name+'_psd.txt', delimiter=',', unpack=True)
+    return sz, pdf
+
+################################################################
+def compare( name, result ):
+    """
+    differences between a result and the golden one, name (path without
+    the _summary.txt): in percent, in each statistic, and the largest in
+    the distribution as a percentage of its peak
+    """
+    scales, pdf, mnsz, srt, sk, kurt = result
+    stats = np.array([mnsz, srt, sk, kurt]+list(percentiles(pdf, scales)[0]))
+    golden = readsummary(name)
+    diff = 100*(stats-golden)/np.abs(golden)
+
+    sz, gpdf = readpsd(name)
+    if len(sz)!=len(scales) or not np.allclose(sz, scales):
+        # different grain sizes: the distributions cannot be compared
+        return diff, np.inf
+    return diff, 100*np.max(np.abs(pdf-gpdf))/np.max(gpdf)
+
+################################################################
+def readtimings( name ):
+    """
+    recorded times and memory: {(python version, image): (reference times, MB)}
+    """
+    timings = {}
+    if os.path.isfile(name):
+        with open(name) as f:
+            for line in f:
+                if line.startswith('%') or not line.strip():
+                    continue
+                version, item, seconds, memory = [s.strip() for s in line.split(',')]
+                timings[(version, item)] = (float(seconds), float(memory))
+    return timings
+
+################################################################
+def writetimings( name, timings ):
+    """
+    writes recorded times and memory (see readtimings)
+    """
+    with open(name,'w') as f:
+        f.write('% python version, image, time (multiples of the reference time), peak memory (MB)\n')
+        for version, item in sorted(timings):
+            seconds, memory = timings[(version, item)]
+            f.write(version+', '+item+', %.3f, %.1f\n' % (seconds, memory))
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("========REGRESSION CHECKS==================")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   golden = False; density = ''
+   tolerance = ''; slowdown = ''; repeats = ''
+
+   usage = 'dgs_regress.py [[-g -d <density> -t <tolerance (%)> -s <slowdown (%)> -n <repeats> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hgd:t:s:n:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-g"):
+         golden = True
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-t"):
+         tolerance = arg
+      elif opt in ("-s"):
+         slowdown = arg
+      elif opt in ("-n"):
+         repeats = arg
+
+   density = int(density) if density else 10
+   tolerance = float(tolerance) if tolerance else 0.01
+   slowdown = float(slowdown) if slowdown else 50
+   repeats = int(repeats) if repeats else 1
+   # sizes in pixels, as the discs' radii are
+   resolution = 1
+
+   images = os.path.join(os.path.dirname(os.path.abspath(__file__)),'images')
+   goldfolder = os.path.join(images,'golden')
+   # the example images' goldens are for the way PIL decodes them
+   decodedfolder = os.path.join(goldfolder,decoder())
+   timingfile = os.path.join(goldfolder,'timings.txt')
+   version = 'python %d.%d' % sys.version_info[:2]
+   timings = readtimings(timingfile)
+   if golden and not os.path.isdir(decodedfolder):
+      os.makedirs(decodedfolder)
+
+   passed = True
+   means = []
+   wrong = checkluminance()
+   print('colour to grey: '+str(wrong)+' pixels differ from PIL')
+   if wrong:
+      passed = False
+   if not golden and not os.path.isdir(decodedfolder):
+      print('no golden results for the example images decoded by '+decoder()+'; write them with -g')
+      passed = False
+
+   reference = calibrate()
+   print('reference time on this machine: %.3f s' % reference)
+   print('image, difference (%) in mean, sorting, skewness, kurtosis, D16, D50, D84, in psd, time (reference times), peak memory (MB)')
+   for name, item in cases(images):
+      runs = [runcase( item, density, resolution ) for i in range(max(repeats, retimes) if golden else repeats)]
+      result = runs[0][0]
+      seconds = min([r[1] for r in runs])/reference
+      # one slow run of a short case is not a slowdown
+      while (version, name) in timings and seconds > timings[(version, name)][0]*(1+slowdown/100.) and len(runs) < retimes:
+         # against the reference measured again: the machine may be busier
+         # than it was at the start
+         again = calibrate()
+         runs.append(runcase( item, density, resolution ))
+         seconds = min(seconds, runs[-1][1]/again)
+      memory = min([r[2] for r in runs])
+      if name.startswith('discs'):
+         means.append(result[2])
+         goldname = os.path.join(goldfolder,name)
+      else:
+         goldname = os.path.join(decodedfolder,name)
+
+      if golden:
+         writeout( goldname, result[0], result[1], result[2], result[3], result[4], result[5], resolution )
+         timings[(version, name)] = (seconds, memory)
+         continue
+
+      if os.path.isfile(goldname+'_summary.txt'):
+         diff, psddiff = compare( goldname, result )
+         line = name+', '+', '.join(['%.4f' % d for d in diff])+', %.4f, %.2f, %.1f' % (psddiff, seconds, memory)
+         if np.max(np.abs(diff))>tolerance or psddiff>tolerance:
+            line = line+'  results differ'
+            passed = False
+      else:
+         line = name+', no golden results, %.2f, %.1f' % (seconds, memory)
+         passed = False
+
+      if (version, name) not in timings:
+         line = line+'  no time or memory recorded for '+version
+         passed = False
+      else:
+         before, beforememory = timings[(version, name)]
+         if seconds > before*(1+slowdown/100.):
+            line = line+'  slower (%.2f before)' % before
+            passed = False
+         if memory > beforememory*(1+slowdown/100.):
+            line = line+'  more memory (%.1f MB before)' % beforememory
+            passed = False
+      print(line)
+
+   # bigger discs must give a bigger mean grain size, and each about what
+   # discs of that size do, whatever the goldens say
+   print('discs of radius '+', '.join([str(r) for r in radii])+' pixels: mean grain size '+', '.join(['%.2f' % m for m in means]))
+   if np.any(np.diff(means)<=0):
+      print('mean grain size does not grow with the size of the discs')
+      passed = False
+   for r, m in zip(radii, means):
+      off = 100*(m/(2.*r)/discmeans[r]-1)
+      line = 'discs of radius %d pixels: mean grain size %.2f diameters (%.2f expected), %.1f %% off' % (r, m/(2.*r), discmeans[r], off)
+      if abs(off) > disctolerance:
+         line = line+'  more than '+str(disctolerance)+' %'
+         passed = False
+      print(line)
+
+   if golden:
+      writetimings(timingfile, timings)
+      print('golden results written to '+goldfolder+' (example images: '+decodedfolder+')')
+      print('times and memory for '+version+' recorded in '+timingfile)
+      if not passed:
+         print('but the analysis is wrong (see above): do not keep these goldens')
+         sys.exit(1)
+      sys.exit()
+
+   if not passed:
+      print('FAILED')
+      sys.exit(1)
+   print('passed')
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
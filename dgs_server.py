@@ -0,0 +1,334 @@
+# dgs_server.py
+# wavelet-based digital grain size analysis as a local web service
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_SERVER.PY
+ {D}IGITAL {G}RAIN {S}IZE - {WAV}ELET, as a service
+ Small local HTTP server which analyses one uploaded image per request
+ and replies with the grain size statistics and distribution as JSON
+
+ Unlike running dgs_wav_p.py once per image, the worker processes are
+ started once and kept, so their transform plans (filters and smoothing
+ kernels, see dgs_plan.py) stay warm between requests and each request
+ only costs the analysis itself. Requests arriving close together are
+ sent to the workers as one batch, and the number of requests in
+ progress at once is limited; requests over the limit are refused
+ (503) rather than queued without bound
+
+ Uses only the python standard library (plus what dgs_core.py needs)
+
+ REQUESTS:
+ POST /analyse?density=10&resolution=0.05   body = image file bytes (any format PIL reads)
+   replies 200 with
+   {"mnsz": , "srt": , "sk": , "kurt": , "sizes": [...], "psd": [...]}
+   or 400 with {"error": "..."} if the image cannot be read or analysed,
+   or 500 with {"error": "..."} if its worker failed, or it took longer than timeout
+ GET /status
+   replies 200 with {"numproc": , "maxrequests": , "inprogress": , "served": }
+
+ OPTIONAL INPUTS [default values]
+ port = port to listen on, on this machine only [8000]
+ numproc = number of worker processes [4]
+ maxrequests = maximum number of requests in progress [4*numproc]
+ batch = time in ms to wait for more requests to batch together [10]
+ density = default density, if the request does not give one [10]
+ resolution = default resolution (mm/pixel), if the request does not give one [1]
+ warm = comma separated image sizes (pixels) to build plans for at start-up []
+ timeout = longest time in s a request waits for its result [600]
+
+ EXAMPLES:
+
+ 1) serve on port 8000 with 8 worker processes, with plans ready for 1944 pixel images
+ python dgs_server.py -n 8 -w 1944
+
+ 2) analyse an image (from another terminal)
+ curl --data-binary @IMG_0202.JPG 'http://localhost:8000/analyse?density=10&resolution=0.05'
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, time, io, json, threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+    import queue
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    import Queue as queue
+from multiprocessing import Pool
+from dgs_core import cropcentral, processregion, waveletplan
+from dgs_io import readimage
+from dgs_fft import shareworkers
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def warmup(sizes):
+    """
+    worker initialiser: build the plans for the given image sizes
+    """
+    for ny in sizes:
+        waveletplan(ny)
+
+################################################################
+def analyseupload(args):
+    """
+    worker: grain size distribution of the central box of an uploaded image
+    returns a dictionary ready to be sent as JSON
+    """
+    data, density, resolution = args
+    try:
+        im = readimage(io.BytesIO(data))
+    except Exception as e:
+        # not only IOError: e.g. PIL's DecompressionBombError for a huge image
+        return {'error': 'cannot read image: '+str(e)}
+    try:
+        region = cropcentral(im)
+        sz, pdf, mnsz, srt, sk, kurt = processregion( region, density, resolution )
+    except Exception as e:
+        return {'error': 'analysis failed: '+str(e)}
+    return {'mnsz': float(mnsz), 'srt': float(srt), 'sk': float(sk), 'kurt': float(kurt),
+            'sizes': [float(s) for s in sz], 'psd': [float(p) for p in pdf]}
+
+################################################################
+class Analyser:
+    """
+    Persistent pool of worker processes, and a thread which batches
+    incoming requests for it
+    """
+
+################################################################
+    def __init__(self, numproc, maxrequests, batch, sizes=[], timeout=600):
+        self.numproc = numproc
+        self.maxrequests = maxrequests
+        self.batch = batch
+        self.timeout = timeout
+        shareworkers(numproc)
+        self.pool = Pool(numproc, warmup, (sizes,))
+        self.slots = threading.BoundedSemaphore(maxrequests)
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.inprogress = 0
+        self.served = 0
+        batcher = threading.Thread(target=self.batcher)
+        batcher.daemon = True
+        batcher.start()
+
+################################################################
+    def analyse(self, data, density, resolution):
+        """
+        analyse one image (bytes) and wait (at most timeout s) for the result
+        returns the HTTP status and the result, or None, straight away, if
+        maxrequests are already in progress
+        """
+        if not self.slots.acquire(False):
+            return None
+        try:
+            with self.lock:
+                self.inprogress = self.inprogress+1
+            done = threading.Event()
+            holder = {}
+            self.requests.put(((data, density, resolution), done, holder))
+            # a worker which died never answers: the slot is freed regardless
+            if not done.wait(self.timeout):
+                return 500, {'error': 'no result within '+str(self.timeout)+' s'}
+            return holder['result']
+        finally:
+            with self.lock:
+                self.inprogress = self.inprogress-1
+                self.served = self.served+1
+            self.slots.release()
+
+################################################################
+    def batcher(self):
+        """
+        collects requests which arrive within batch seconds of the first
+        and hands them to the pool together
+        """
+        while True:
+            batch = [self.requests.get()]
+            end = time.time()+self.batch
+            while True:
+                wait = end-time.time()
+                if wait<=0:
+                    break
+                try:
+                    batch.append(self.requests.get(True, wait))
+                except queue.Empty:
+                    break
+            self.submit(batch)
+
+################################################################
+    def submit(self, batch):
+        """
+        spread a batch of requests over the workers, a chunk each
+        """
+        def done(results):
+            for (args, event, holder), result in zip(batch, results):
+                holder['result'] = (400 if 'error' in result else 200), result
+                event.set()
+        def failed(e):
+            for args, event, holder in batch:
+                holder['result'] = 500, {'error': 'analysis failed: '+str(e)}
+                event.set()
+        chunk = int(np.ceil(len(batch)/float(self.numproc)))
+        tasks = [b[0] for b in batch]
+        try:
+            self.pool.map_async(analyseupload, tasks, chunk, callback=done, error_callback=failed)
+        except TypeError:
+            # python 2 has no error_callback: requests wait for the timeout
+            self.pool.map_async(analyseupload, tasks, chunk, callback=done)
+
+################################################################
+    def status(self):
+        with self.lock:
+            return {'numproc': self.numproc, 'maxrequests': self.maxrequests,
+                    'inprogress': self.inprogress, 'served': self.served}
+
+################################################################
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /analyse and GET /status
+    """
+
+################################################################
+    def reply(self, code, result):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+################################################################
+    def do_GET(self):
+        if urlparse(self.path).path != '/status':
+            self.reply(404, {'error': 'unknown path'})
+            return
+        self.reply(200, self.server.analyser.status())
+
+################################################################
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/analyse':
+            self.reply(404, {'error': 'unknown path'})
+            return
+        query = parse_qs(url.query)
+        try:
+            density = int(query.get('density',[self.server.density])[0])
+            resolution = float(query.get('resolution',[self.server.resolution])[0])
+        except ValueError:
+            self.reply(400, {'error': 'density and resolution must be numbers'})
+            return
+        length = int(self.headers.get('content-length', 0))
+        if not length:
+            self.reply(400, {'error': 'no image'})
+            return
+        data = self.rfile.read(length)
+
+        reply = self.server.analyser.analyse(data, density, resolution)
+        if reply is None:
+            self.reply(503, {'error': 'busy'})
+        else:
+            self.reply(*reply)
+
+################################################################
+class Server(ThreadingMixIn, HTTPServer):
+    """
+    one thread per connection; the work itself is done by the Analyser's pool
+    """
+    daemon_threads = True
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("=========LOCAL ANALYSIS SERVICE============")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   port = ''; numproc = ''
+   maxrequests = ''; batch = ''
+   density = ''; resolution = ''
+   warm = ''; timeout = ''
+
+   usage = 'dgs_server.py [[-p <port> -n <number of processors> -m <max requests in progress> -b <batch window (ms)> -d <default density> -r <default resolution (mm/pixel)> -w <image sizes to warm up, e.g. 1944,2592> -t <timeout per request (s)> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hp:n:m:b:d:r:w:t:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-p"):
+         port = arg
+      elif opt in ("-n"):
+         numproc = arg
+      elif opt in ("-m"):
+         maxrequests = arg
+      elif opt in ("-b"):
+         batch = arg
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-r"):
+         resolution = arg
+      elif opt in ("-w"):
+         warm = arg
+      elif opt in ("-t"):
+         timeout = arg
+
+   port = int(port) if port else 8000
+   numproc = int(numproc) if numproc else 4
+   maxrequests = int(maxrequests) if maxrequests else 4*numproc
+   batch = float(batch) if batch else 10
+   density = int(density) if density else 10
+   resolution = float(resolution) if resolution else 1
+   sizes = [int(s) for s in warm.split(',')] if warm else []
+   timeout = float(timeout) if timeout else 600
+
+   print('Number of processors is '+str(numproc))
+   print('At most '+str(maxrequests)+' requests in progress')
+   print('Requests within '+str(batch)+' ms are batched together')
+   print('Default density is '+str(density)+', default resolution is '+str(resolution)+' mm/pixel')
+   if sizes:
+      print('Plans ready for images of '+', '.join(map(str,sizes))+' pixels')
+   print('Requests wait at most '+str(timeout)+' s for their result')
+
+   server = Server(('127.0.0.1', port), Handler)
+   server.analyser = Analyser(numproc, maxrequests, batch/1000., sizes, timeout)
+   server.density = density
+   server.resolution = resolution
+
+   print('Listening on http://127.0.0.1:'+str(port)+'/analyse')
+   try:
+      server.serve_forever()
+   except KeyboardInterrupt:
+      pass
+   server.analyser.pool.terminate()
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
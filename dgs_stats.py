@@ -0,0 +1,188 @@
+# dgs_stats.py
+# grain size statistics for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_STATS.PY
+ The last stage of the analysis: from the variance of the wavelet power at
+ each scale to the grain size distribution, its moments (mean, sorting,
+ skewness, kurtosis) and percentiles (e.g. D16, D50, D84)
+
+ Works on a matrix with one row per image (or window), so many images
+ are done in one pass. The Kaiser window applied to each distribution
+ depends only on the number of scales and on the image contrast, so the
+ windows are cached rather than recomputed for every image
+
+ Columns transformed in separate blocks (e.g. by different processes) are
+ combined with accumulators (count, mean and sum of squared differences at
+ each scale), so only those need be passed back, not every column
+
+ Confidence intervals on the statistics of an image come from resampling
+ (bootstrapping) the columns already transformed, so cost a few matrix
+ products rather than more wavelet transforms. The resamples are drawn
+ with a fixed seed (bootseed), so the same image and settings always
+ give the same intervals
+'''
+
+from __future__ import division, print_function
+import numpy as np
+from scipy.signal.windows import kaiser as _kaiser
+
+# Kaiser windows already computed in this process, keyed by (n, beta)
+_windows = {}
+
+# seed of the bootstrap resamples, so confidence intervals can be reproduced
+bootseed = 0
+
+################################################################
+def kaiser(n, beta):
+    """
+    (cached) Kaiser window of length n and shape beta; do not modify it
+    """
+    key = (int(n), beta)
+    if key not in _windows:
+        w = _kaiser(int(n), beta)
+        w.setflags(write=False)
+        _windows[key] = w
+    return _windows[key]
+
+################################################################
+def distributions(V, scales, ny, mults, resolution):
+    """
+    grain size distributions from the column-wise variance at each scale
+    V is (nimages, nscale), mults the Kaiser window shape for each image
+    returns the grain sizes (scales*1.5*resolution, those < ny/3 pixels)
+    and the distributions over them, (nimages, nsizes)
+    """
+    V = np.atleast_2d(V)
+    nscale = np.shape(V)[1]
+    P = V/np.sum(V,axis=1)[:,np.newaxis]
+    mults = np.atleast_1d(mults)
+    if np.all(mults==mults[0]):
+        # one window for all (e.g. bootstrap resamples of one image)
+        P = P*kaiser(nscale,mults[0])
+    else:
+        P = P*np.vstack([kaiser(nscale,mult) for mult in mults])
+    P = P/np.sum(P,axis=1)[:,np.newaxis]
+
+    index = scales<ny//3
+    return scales[index]*1.5*resolution, P[:,index]
+
+################################################################
+def moments(P, sizes):
+    """
+    mean, sorting, skewness and kurtosis of each distribution (row) of P
+    returns four arrays of length nimages
+    """
+    P = np.atleast_2d(P)
+    mnsz = np.dot(P,sizes)
+    dev = sizes-mnsz[:,np.newaxis]
+    dev2 = dev*dev
+    srt = np.sqrt(np.sum(P*dev2,axis=1))
+    sk = np.sum(P*dev2*dev,axis=1)/(100*srt**3)
+    kurt = np.sum(P*dev2*dev2,axis=1)/(100*srt**4)
+    return mnsz, srt, sk, kurt
+
+################################################################
+def percentiles(P, sizes, ps=(16,50,84)):
+    """
+    grain sizes (e.g. D16, D50, D84) below which ps percent of each
+    distribution (row) of P lies, interpolating linearly between sizes
+    returns (nimages, len(ps))
+    """
+    P = np.atleast_2d(P)
+    nimages, nsizes = np.shape(P)
+    cdf = np.cumsum(P,axis=1)
+    rows = np.arange(nimages)
+    D = np.zeros((nimages,len(ps)))
+    for j in range(len(ps)):
+        q = ps[j]/100.
+        # first size at which the cumulative distribution reaches q
+        i = np.clip(np.sum(cdf<q,axis=1),1,nsizes-1)
+        c0 = cdf[rows,i-1]
+        c1 = cdf[rows,i]
+        D[:,j] = sizes[i-1]+(q-c0)/(c1-c0)*(sizes[i]-sizes[i-1])
+    return np.clip(D,sizes[0],sizes[-1])
+
+################################################################
+def summarise(V, scales, ny, mults, resolution):
+    """
+    distributions and moments for many images at once (see distributions)
+    returns sizes, P, mnsz, srt, sk, kurt; all but sizes have a row per image
+    """
+    sizes, P = distributions(V, scales, ny, mults, resolution)
+    mnsz, srt, sk, kurt = moments(P, sizes)
+    return sizes, P, mnsz, srt, sk, kurt
+
+################################################################
+def accumulate(D):
+    """
+    partial accumulator for the column-wise variance of a block of columns
+    D (ncolumns, nscale): the number of columns, their mean and the sum of
+    squared differences from it, at each scale
+    """
+    D = np.atleast_2d(D)
+    mean = np.mean(D,axis=0)
+    return len(D), mean, np.sum((D-mean)**2,axis=0)
+
+################################################################
+def merge(a, b):
+    """
+    accumulator for the columns of two accumulators together
+    (Chan, Golub and LeVeque's pairwise update)
+    """
+    na, ma, m2a = a
+    nb, mb, m2b = b
+    n = na+nb
+    delta = mb-ma
+    return n, ma+delta*(float(nb)/n), m2a+m2b+delta**2*(float(na)*nb/n)
+
+################################################################
+def variance(a):
+    """
+    column-wise variance at each scale, from an accumulator (as np.var(Or1,axis=1))
+    """
+    return a[2]/a[0]
+
+################################################################
+def getstats(Or1, scales, ny, mult, resolution):
+    """
+    grain size distribution and its moments for one image from the
+    per-column variances Or1 (nscale, ncolumns), as at the end of processimage
+    """
+    sizes, P, mnsz, srt, sk, kurt = summarise(np.var(Or1,axis=1), scales, ny, [mult], resolution)
+    return sizes, P[0], mnsz[0], srt[0], sk[0], kurt[0]
+
+################################################################
+def bootstrap(Or1, scales, ny, mult, resolution, nboot=1000, level=95, seed=bootseed):
+    """
+    confidence intervals on mean, sorting, skewness and kurtosis of one
+    image, from nboot resamples (with replacement) of its columns Or1
+    (nscale, ncolumns); level is the confidence level in percent, and
+    seed that of the resamples (None for different ones every time)
+    returns (4, 2): lower and upper limits of mnsz, srt, sk and kurt
+    """
+    X = np.asarray(Or1,dtype=np.float64).T
+    ncol = np.shape(X)[0]
+    # centred, so the variances below lose nothing to rounding
+    X = X-np.mean(X,axis=0)
+
+    # every resample as an (nboot, ncolumns) matrix of column indices,
+    # turned into how many times each column is drawn in each resample
+    index = np.random.RandomState(seed).randint(0,ncol,(nboot,ncol))
+    counts = np.bincount((index+ncol*np.arange(nboot)[:,np.newaxis]).ravel(), minlength=nboot*ncol)
+    W = np.reshape(counts,(nboot,ncol))/float(ncol)
+
+    # column-wise variance at each scale, for all resamples at once
+    mean = np.dot(W,X)
+    V = np.dot(W,X*X)-mean*mean
+
+    sizes, P, mnsz, srt, sk, kurt = summarise(V, scales, ny, [mult]*nboot, resolution)
+    tail = (100-level)/2.
+    return np.array([np.percentile(stat,[tail,100-tail]) for stat in [mnsz, srt, sk, kurt]])
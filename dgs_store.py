@@ -0,0 +1,360 @@
+# dgs_store.py
+# a store of the results of many images, for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_STORE.PY
+ The results of a whole campaign (thousands of images) in one folder,
+ as a few files which are read memory mapped, rather than two text files
+ per image which must each be parsed: so the distributions and statistics
+ of every image can be worked on at once, as numpy arrays, without
+ reading them into memory first
+
+ A store is a folder of:
+ psd.f8      the grain size distribution of each image, one after another:
+             rows of (grain size, density), as 64-bit floats
+ summary.f8  a row per image: the statistics writeout writes (see columns)
+ index.txt   a line per image: its first row in psd.f8, its number of
+             rows, and the image
+
+ writeout (in dgs_core.py) adds each image to a store as well as writing
+ its text files, if given one (dgs_wav.py and dgs_wav_p.py, -a). The data
+ files are made bigger ahead of time, doubling each time they fill up, so
+ adding an image only writes its own rows. An image is in the store once
+ its line is in the index, which is written last: an analysis which dies
+ part way leaves nothing behind but rows which the next image overwrites
+ An image already in the store is not added again (so a folder analysed
+ twice, or a batch run again image by image, counts each image once; use
+ a new store for results with other settings)
+ Images are added under a lock on the index, so several processes on one
+ machine can add to the same store (but use a store per machine with
+ dgs_dist.py: locks on shared network storage cannot be relied on)
+
+ Reading a store (Store(folder)) maps its arrays: store.summary has a row
+ per image, store.column('D50') is one statistic for every image, and if
+ the images all have the same grain sizes (as images of the same size
+ and resolution do), store.table() gives their distributions as one
+ (images, sizes) array. None of these are copies
+
+ Run on its own, a store is summarised, and the campaign's mean distribution
+ written to campaign_psd.txt in it. Text results already written (the
+ _psd.txt and _summary.txt files of a folder) can be added to a store
+
+ REQUIRED INPUTS:
+ store e.g. '/home/my_campaign_store'
+
+ OPTIONAL INPUTS [default values]
+ folder = folder of text results to add to the store first [none]
+
+ EXAMPLES:
+
+ 1) summarise a store
+ python dgs_store.py -a /home/my_campaign_store
+
+ 2) add the text results of a folder analysed before, and summarise
+ python dgs_store.py -a /home/my_campaign_store -f /home/my_sediment_images
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os, glob
+
+try:
+    import fcntl
+except ImportError:
+    # no locks: only one process may add to a store at a time
+    fcntl = None
+
+# the statistics in each row of summary.f8
+columns = ['resolution', 'mean', 'sorting', 'skewness', 'kurtosis', 'D16', 'D50', 'D84',
+           'mean lower', 'mean upper', 'sorting lower', 'sorting upper',
+           'skewness lower', 'skewness upper', 'kurtosis lower', 'kurtosis upper']
+
+# smallest size (bytes) a data file is made, and data type of its values
+initialbytes = 1 << 20
+dtype = np.dtype('<f8')
+
+# open stores, by folder
+_stores = {}
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def getstore( folder ):
+    """
+    return the (cached) Store in folder
+    """
+    if folder not in _stores:
+        _stores[folder] = Store(folder)
+    return _stores[folder]
+
+################################################################
+def writerows( name, start, block ):
+    """
+    writes the rows of block into data file name from row start, making
+    the file bigger first (at least twice as big) if they do not fit
+    """
+    rowbytes = block.shape[1]*dtype.itemsize
+    with open(name,'r+b') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = (start+len(block))*rowbytes
+        if end > size:
+            f.truncate(max(end, 2*size, initialbytes))
+        f.seek(start*rowbytes)
+        f.write(np.ascontiguousarray(block, dtype).tobytes())
+
+################################################################
+def maprows( name, nrows, ncols ):
+    """
+    the first nrows rows of data file name, memory mapped (read only)
+    """
+    if not nrows:
+        return np.zeros((0, ncols), dtype)
+    return np.memmap(name, dtype, 'r', shape=(nrows, ncols))
+
+################################################################
+class Store:
+    """
+    Results of many images kept in a folder: the distributions and
+    statistics of all of them as memory mapped arrays, and an index
+    """
+
+################################################################
+    def __init__(self, folder):
+        self.folder = folder
+        if os.path.isdir(folder)==False:
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # another process made it first
+                pass
+        for name in ['psd.f8','summary.f8','index.txt']:
+            open(self._path(name),'ab').close()
+        self.names = []
+        self._known = set()
+        self._first = []
+        self._rows = []
+        self._pos = 0
+        self.refresh()
+
+################################################################
+    def _path(self, name):
+        return self.folder+os.sep+name
+
+################################################################
+    def _readindex(self):
+        """
+        read the lines added to the index since it was last read; a line
+        not yet finished is left for next time
+        """
+        with open(self._path('index.txt'),'rb') as f:
+            f.seek(self._pos)
+            for line in iter(f.readline, b''):
+                if not line.endswith(b'\n'):
+                    break
+                self._pos = f.tell()
+                line = line.decode('utf-8')
+                if line.startswith('%'):
+                    continue
+                first, rows, item = line.rstrip('\n').split(', ', 2)
+                self._first.append(int(first))
+                self._rows.append(int(rows))
+                self.names.append(item)
+                self._known.add(item)
+
+################################################################
+    def refresh(self):
+        """
+        read the images added since the store was opened (or last refreshed),
+        and map the arrays again to include them
+        """
+        self._readindex()
+        self.first = np.array(self._first, int)
+        self.rows = np.array(self._rows, int)
+        self.psd = maprows(self._path('psd.f8'), int(np.sum(self.rows)), 2)
+        self.summary = maprows(self._path('summary.f8'), len(self.names), len(columns))
+
+################################################################
+    def __len__(self):
+        return len(self.names)
+
+################################################################
+    def __contains__(self, item):
+        return item in self._known
+
+################################################################
+    def append(self, item, sz, pdf, stats, resolution, ci=None):
+        """
+        add an image: its grain sizes and distribution, stats (mean,
+        sorting, skewness, kurtosis, D16, D50 and D84), the resolution
+        and, if any, confidence intervals on the first four statistics
+        (the arrays are not refreshed: see refresh)
+        returns False, and adds nothing, if item is in the store already
+        """
+        block = np.column_stack((np.ravel(sz), np.ravel(pdf)))
+        if ci is None:
+            ci = np.nan*np.ones(len(columns)-8)
+        row = np.hstack(([resolution], stats, np.ravel(ci)))[np.newaxis]
+
+        line = str(len(block))+', '+item+'\n'
+        if not isinstance(line, bytes):
+            line = line.encode('utf-8')
+
+        with open(self._path('index.txt'),'ab') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # others may have added images since
+                self._readindex()
+                if item in self._known:
+                    return False
+                if os.fstat(f.fileno()).st_size > self._pos:
+                    # a line left unfinished by a process which died
+                    f.truncate(self._pos)
+                if not self._pos:
+                    f.write(b'% first row in psd.f8, rows, image\n')
+                start = self._first[-1]+self._rows[-1] if self.names else 0
+                writerows(self._path('psd.f8'), start, block)
+                writerows(self._path('summary.f8'), len(self.names), row)
+                # the image is in the store once this line is
+                f.write(str(start).encode('utf-8')+b', '+line)
+                f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return True
+
+################################################################
+    def column(self, name):
+        """
+        one statistic (see columns) for every image
+        """
+        return self.summary[:, columns.index(name)]
+
+################################################################
+    def distribution(self, i):
+        """
+        grain sizes and distribution of image number i
+        """
+        block = self.psd[self.first[i]:self.first[i]+self.rows[i]]
+        return block[:,0], block[:,1]
+
+################################################################
+    def table(self):
+        """
+        grain sizes, and the distributions of all the images as an (images,
+        sizes) array, if they all have the same grain sizes
+        """
+        if not len(self.names) or np.any(self.rows!=self.rows[0]):
+            raise ValueError('images in the store have different grain sizes')
+        block = self.psd.reshape(len(self.names), self.rows[0], 2)
+        if np.any(block[:,:,0]!=block[0,:,0]):
+            raise ValueError('images in the store have different grain sizes')
+        return block[0,:,0], block[:,:,1]
+
+################################################################
+def readresults( name ):
+    """
+    grain sizes, distribution, statistics (see Store.append), resolution and
+    confidence intervals (or None) from the text files writeout writes, name
+    being their path without _psd.txt or _summary.txt
+    """
+    sz, pdf = np.loadtxt(name+'_psd.txt', delimiter=',', unpack=True)
+    with open(name+'_summary.txt') as f:
+        lines = [l for l in f if not l.startswith('%')]
+    # resolution, a line for each moment, the percentiles, then any intervals
+    values = [float(l) for l in lines[:5]]
+    stats = values[1:]+[float(d) for d in lines[5].split(',')]
+    ci = None
+    if len(lines) > 6:
+        ci = [[float(v) for v in l.split(',')] for l in lines[6:10]]
+    return sz, pdf, stats, values[0], ci
+
+################################################################
+def importfolder( store, folder ):
+    """
+    add the text results in folder to store, skipping images already in it
+    returns the number added
+    """
+    count = 0
+    for summary in sorted(glob.glob(folder+os.sep+'*_summary.txt')):
+        item = summary[:-len('_summary.txt')]
+        if item in store or not os.path.isfile(item+'_psd.txt'):
+            continue
+        sz, pdf, stats, resolution, ci = readresults(item)
+        if store.append(item, sz, pdf, stats, resolution, ci):
+            count = count+1
+    return count
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("========RESULTS STORE======================")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   storefolder = ''; folder = ''
+
+   usage = 'dgs_store.py -a <store> [[-f <folder of text results to add> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"ha:f:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-a"):
+         storefolder = arg
+      elif opt in ("-f"):
+         folder = arg
+
+   # exit program if no store given
+   if not storefolder:
+      print('A store is required!!!!!!')
+      sys.exit(2)
+
+   store = Store(storefolder)
+   if folder:
+      count = importfolder( store, folder )
+      print(str(count)+' images added from '+folder)
+      store.refresh()
+
+   print(str(len(store))+' images in '+storefolder)
+   if not len(store):
+      sys.exit()
+
+   for name in ['mean', 'sorting', 'D16', 'D50', 'D84']:
+      values = store.column(name)
+      print(name+': mean %.4f, standard deviation %.4f, range %.4f to %.4f' % (np.mean(values), np.std(values), np.min(values), np.max(values)))
+
+   try:
+      sz, P = store.table()
+   except ValueError as e:
+      print(str(e)+'; no campaign distribution written')
+      sys.exit()
+   with open(storefolder+os.sep+'campaign_psd.txt','w') as f:
+      np.savetxt(f, np.column_stack((sz, np.mean(P, axis=0))), delimiter=', ', fmt='%s')
+   print('mean distribution of the campaign saved to '+storefolder+os.sep+'campaign_psd.txt')
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
@@ -0,0 +1,323 @@
+# dgs_stream.py
+# wavelet-based digital grain size analysis of video / image sequences
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_STREAM.PY
+ {D}IGITAL {G}RAIN {S}IZE - {WAV}ELET, streamed
+ Python function to compute a time series of grain size statistics
+ from a continuous seabed camera: frames are read one at a time from a
+ video file or a numbered image sequence, analysed on a pool of worker
+ processes, and each result is written as soon as it is ready
+
+ Frames are handed to the workers through a bounded queue, so reading
+ stops (rather than memory filling up) if analysis falls behind
+
+ REQUIRED INPUTS:
+ input = video file (needs OpenCV, cv2), a folder of frames,
+         or a wildcard pattern e.g. '/home/cam/frame_*.jpg'
+ output = text file for the time series
+
+ OPTIONAL INPUTS [default values]
+ density = process every density lines of each frame [10]
+ resolution = spatial resolution of image in mm/pixel [1]
+ numproc = number of processors [4]
+ every = analyse only every Nth frame [1]
+ threshold = analyse a frame only if its mean absolute difference from the
+             last analysed frame is at least this many grey levels [0]
+ queue = maximum number of frames waiting for, or in, analysis [2*numproc]
+
+ OUTPUTS:
+ a text file with one line per analysed frame:
+ frame number, time (s; from the frame rate for video, the file time for image sequences),
+ mean grain size, sorting, skewness, kurtosis
+
+ EXAMPLES:
+
+ 1) every frame of a video
+ python dgs_stream.py -i /home/cam/dive1.avi -o /home/cam/dive1_dgs.txt
+
+ 2) every 5th frame of a numbered image sequence, skipping frames which have not changed, on 8 processors
+ python dgs_stream.py -i '/home/cam/frame_*.jpg' -o /home/cam/dgs.txt -e 5 -t 2 -n 8
+
+ SOFTWARE REQUIREMENTS:
+ as dgs_wav_p.py, and for video files
+ OpenCV (cv2) python bindings
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os, glob, time, re
+from multiprocessing import Pool
+from collections import deque
+from dgs_core import cropcentral, processregion
+from dgs_io import readimage, listimages
+from dgs_fft import shareworkers
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def naturalkey(s):
+    """
+    sort key so that frame_2 comes before frame_10
+    """
+    return [int(t) if t.isdigit() else t for t in re.split(r'(\d+)', s)]
+
+################################################################
+def readvideo(item):
+    """
+    generator of (frame number, time, frame) from a video file
+    """
+    if cv2 is None:
+        raise ImportError('reading video files needs OpenCV (cv2)')
+    cap = cv2.VideoCapture(item)
+    if not cap.isOpened():
+        raise IOError('cannot open '+item)
+    fps = cap.get(cv2.CAP_PROP_FPS) if hasattr(cv2,'CAP_PROP_FPS') else cap.get(5)
+    index = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if frame.ndim==3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if fps>0:
+            yield index, index/fps, frame
+        else:
+            yield index, index, frame
+        index = index+1
+    cap.release()
+
+################################################################
+def readsequence(item):
+    """
+    generator of (frame number, time, frame) from a folder or
+    wildcard pattern of numbered images; the frame is None if its
+    image cannot be read (a corrupt or truncated file)
+    """
+    if os.path.isdir(item):
+        files = listimages(item)
+    else:
+        files = glob.glob(item)
+    files = sorted(files, key=naturalkey)
+    for index in range(len(files)):
+        t, frame = np.nan, None
+        try:
+            t = os.path.getmtime(files[index])
+            frame = readimage(files[index])
+        except Exception as e:
+            print('frame ', index, ' could not be read: ', e)
+        yield index, t, frame
+
+################################################################
+def readframes(item):
+    """
+    generator of (frame number, time, frame) from a video or an image sequence
+    """
+    if os.path.isfile(item) and os.path.splitext(item)[1].lower() in ['.avi','.mp4','.mov','.mkv','.mpg','.mpeg','.wmv']:
+        return readvideo(item)
+    return readsequence(item)
+
+################################################################
+def selectframes(frames, every, threshold):
+    """
+    passes on every Nth frame, and of those only frames which differ
+    from the last one passed on by at least threshold grey levels
+    (compared on a coarse grid of pixels, which is plenty to tell);
+    frames which could not be read (None) are passed on, as gaps
+    """
+    last = None
+    for index, t, frame in frames:
+        if index % every:
+            continue
+        if threshold>0 and frame is not None:
+            thumb = frame[::8,::8].astype(np.float32)
+            if last is not None and np.mean(np.abs(thumb-last)) < threshold:
+                continue
+            last = thumb
+        yield index, t, frame
+
+################################################################
+def streamframe( frame, density, resolution ):
+    """
+    worker: grain size statistics of the central box of one frame
+    """
+    region = cropcentral(frame)
+    sz, pdf, mnsz, srt, sk, kurt = processregion( region, density, resolution )
+    return mnsz, srt, sk, kurt
+
+################################################################
+def processstream( item, output, density, resolution, numproc, every, threshold, queue ):
+    """
+    analyses frames from item on numproc processes, with at most queue frames
+    in flight, and writes one line per frame to output, in frame order
+    returns the number of frames analysed
+    """
+    shareworkers(numproc)
+    pool = Pool(numproc)
+    pending = deque()
+    count = 0
+
+    try:
+        with open(output,'w') as f:
+            f.write('% frame, time (s), mean grain size, sorting, skewness, kurtosis\n')
+
+            def writeoldest():
+                index, t, result = pending.popleft()
+                try:
+                    if result is None:
+                        raise IOError('frame could not be read')
+                    mnsz, srt, sk, kurt = result.get()
+                except Exception as e:
+                    # one bad frame is a gap in the time series, not the end of it
+                    print('frame ', index, ' failed: ', e)
+                    mnsz, srt, sk, kurt = np.nan, np.nan, np.nan, np.nan
+                f.write(', '.join(map(str,[index, t, mnsz, srt, sk, kurt]))+'\n')
+                f.flush()
+                print('frame ', index, ': mean size = ', mnsz)
+
+            for index, t, frame in selectframes(readframes(item), every, threshold):
+                # wait for the oldest frame before reading any more
+                while len(pending) >= queue:
+                    writeoldest()
+                if frame is None:
+                    pending.append((index, t, None))
+                else:
+                    pending.append((index, t, pool.apply_async(streamframe, (frame, density, resolution))))
+                    count = count+1
+
+            while pending:
+                writeoldest()
+        pool.close()
+    except:
+        # frames still queued are dropped, rather than left running
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return count
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   start = time.time()
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("====TIME SERIES OF GRAIN SIZE FROM VIDEO===")
+   print("=====OR SEQUENCES OF SEDIMENT IMAGES=======")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   item = ''; output = ''
+   density = ''; resolution = ''
+   numproc = ''; every = ''
+   threshold = ''; queue = ''
+
+   usage = 'dgs_stream.py -i <video file, folder or pattern> -o <output file> [[-d <density> -r <resolution (mm/pixel)> -n <number of processors> -e <analyse every Nth frame> -t <change threshold (grey levels)> -q <queue length> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hi:o:d:r:n:e:t:q:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-i"):
+         item = arg
+      elif opt in ("-o"):
+         output = arg
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-r"):
+         resolution = arg
+      elif opt in ("-n"):
+         numproc = arg
+      elif opt in ("-e"):
+         every = arg
+      elif opt in ("-t"):
+         threshold = arg
+      elif opt in ("-q"):
+         queue = arg
+
+   # exit program if no input or output given
+   if not item or not output:
+      print('An input and an output file are required!!!!!!')
+      print(usage)
+      sys.exit(2)
+
+   print('Input is ', item)
+   print('Output file is ', output)
+
+   if density:
+      density = int(density)
+      print('Every '+str(density)+' rows will be processed')
+   else:
+      density = 10
+      print('[Default] Density is '+str(density))
+
+   if resolution:
+      resolution = float(resolution)
+      print('Resolution is '+str(resolution))
+   else:
+      resolution = 1
+      print('[Default] Resolution is '+str(resolution)+' mm/pixel')
+
+   if numproc:
+      numproc = int(numproc)
+      print('Number of processors is '+str(numproc))
+   else:
+      numproc = 4
+      print('[Default] Number of processors is '+str(numproc))
+
+   if every:
+      every = int(every)
+      print('Every '+str(every)+' frames will be analysed')
+   else:
+      every = 1
+      print('[Default] Every frame will be analysed')
+
+   if threshold:
+      threshold = float(threshold)
+      print('Frames must differ by '+str(threshold)+' grey levels to be analysed')
+   else:
+      threshold = 0
+      print('[Default] Frames are analysed whether or not they have changed')
+
+   if queue:
+      queue = int(queue)
+   else:
+      queue = 2*numproc
+   print('At most '+str(queue)+' frames are queued for analysis')
+
+   count = processstream( item, output, density, resolution, numproc, every, threshold, queue )
+
+   print("===========================================")
+   elapsed = (time.time() - start)
+   print("Processing took ", elapsed , "seconds to analyse ", count, "frames")
+   print('time series saved to ',output)
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
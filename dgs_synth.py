@@ -0,0 +1,249 @@
+# dgs_synth.py
+# synthetic images of grains of known size for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_SYNTH.PY
+ Images of randomly placed, overlapping grains (discs, shaded like spheres
+ lit from above, on a dark background): a bed of grains whose size
+ distribution is known exactly, to check the analysis against (see
+ dgs_regress.py) and to measure how it scales (see dgs_bench.py)
+
+ Grain diameters are log-normal: a median size (mm) and a sorting (the
+ standard deviation of log2 of the diameter, in phi units; 0 for grains
+ all the same size), made into pixels by the resolution (mm/pixel)
+
+ Images are drawn a strip of rows at a time into the output array, which
+ can be a memory mapped .npy file, so images of tens of thousands of
+ pixels a side need memory only for one strip, not the whole image
+ A folder of many such images can be made at once, with a list of
+ the sizes in each
+
+ The same seed always gives the same image
+
+ OPTIONAL INPUTS [default values]
+ folder = folder to write the images in [synthetic]
+ number = number of images [1]
+ width, height = size of each image in pixels [1024, width]
+ size = median grain diameter in mm [0.5]
+ sorting = standard deviation of log2 grain diameter (phi units) [0.5]
+ resolution = spatial resolution in mm/pixel [0.05]
+ type = image file type: png, jpg, tif or npy (npy is written a strip at a time) [png]
+ seed = seed of the first image; each image uses the next [0]
+
+ EXAMPLES:
+
+ 1) one 1024 pixel square image, grains of 0.5 mm at 0.05 mm/pixel
+ python dgs_synth.py -f /home/synthetic
+
+ 2) 2000 images of well sorted coarse sand
+ python dgs_synth.py -f /home/synthetic -n 2000 -s 1 -g 0.25
+
+ 3) one image 30000 pixels a side, as a memory mapped numpy array
+ python dgs_synth.py -f /home/synthetic -x 30000 -t npy
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+# grey level of the background, and the range of grain brightness
+background = 30
+brightness = (120, 250)
+
+# rows drawn at once (bounds the memory used)
+striprows = 1024
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def grain(radius):
+    """
+    grey level profile (0 to 1) of one grain of radius pixels, as a sphere
+    seen from above, in a square of side 2*ceil(radius)+1
+    """
+    r = int(np.ceil(radius))
+    y, x = np.mgrid[-r:r+1, -r:r+1]
+    d2 = (x*x+y*y)/float(radius*radius)
+    return np.sqrt(np.clip(1-d2,0,1))
+
+################################################################
+def radii(rng, number, radius, sorting):
+    """
+    number grain radii (pixels), log-normal about radius with sorting in
+    phi units, rounded to quarter pixels (so their profiles can be shared)
+    """
+    if not sorting:
+        return np.repeat(float(radius), number)
+    r = radius*2**(sorting*rng.standard_normal(number))
+    return np.maximum(np.round(4*r)/4., 1)
+
+################################################################
+def bed(height, width, radius, sorting=0, fill=1.5, seed=0, out=None):
+    """
+    height by width 8-bit image of grains with median radius (pixels) and
+    sorting (see radii), enough of them to cover the image fill times
+    over (so most of it is covered, and grains hide parts of each other,
+    as in a real bed), drawn a strip of rows at a time into out if given
+    """
+    rng = np.random.RandomState(seed)
+    # expected area of a grain, for a log-normal radius
+    area = np.pi*radius*radius*np.exp(2*(sorting*np.log(2))**2)
+    number = int(fill*height*width/area)
+    # largest grain, which can overlap the edges of the image or a strip
+    m = int(np.ceil(radius*2**(4*sorting)))
+
+    rows = rng.randint(0, height+2*m, number)-m
+    cols = rng.randint(0, width+2*m, number)-m
+    levels = rng.uniform(brightness[0], brightness[1], number)
+    r = radii(rng, number, radius, sorting)
+    if sorting:
+        # none bigger than the margin
+        r = np.minimum(r, m)
+    profiles = {}
+
+    if out is None:
+        out = np.empty((height, width), np.uint8)
+    for s in range(0, height, striprows):
+        n = min(striprows, height-s)
+        # with a margin of 2*m, for grains centred up to m outside the strip
+        strip = np.zeros((n+4*m, width+4*m), np.float32)
+        # grains which reach into this strip, in the order they were laid down
+        index = np.flatnonzero((rows >= s-m) & (rows < s+n+m))
+        for i, j, level, g in zip(rows[index]-s+2*m, cols[index]+2*m, levels[index], r[index]):
+            if g not in profiles:
+                profiles[g] = grain(g)
+            profile = profiles[g]
+            k = (len(profile)-1)//2
+            box = strip[i-k:i+k+1, j-k:j+k+1]
+            # later grains lie on top of earlier ones
+            np.copyto(box, level*profile, where=profile>0)
+
+        strip = strip[2*m:n+2*m, 2*m:width+2*m]
+        strip = np.where(strip>0, strip, background)+rng.normal(0, 2, (n,width))
+        out[s:s+n] = np.uint8(np.clip(strip+0.5, 0, 255))
+    return out
+
+################################################################
+def discs(n, radius, fill=1.5, seed=0):
+    """
+    n by n 8-bit image of discs all of radius pixels (see bed)
+    """
+    return bed(n, n, radius, 0, fill, seed)
+
+################################################################
+def writebed( name, height, width, radius, sorting, seed ):
+    """
+    writes one image of grains (see bed) to name: .npy files a strip at
+    a time, other types through PIL
+    """
+    if name.endswith('.npy'):
+        out = np.lib.format.open_memmap(name, mode='w+', dtype=np.uint8, shape=(height, width))
+        bed(height, width, radius, sorting, seed=seed, out=out)
+        del out
+    else:
+        Image.fromarray(bed(height, width, radius, sorting, seed=seed)).save(name)
+
+################################################################
+def makefolder( folder, number, height, width, size, sorting, resolution, ext='png', seed=0 ):
+    """
+    writes number images of grains of median diameter size (mm) and sorting
+    (phi) at resolution (mm/pixel) to folder, and a list of them with
+    their sizes (synthetic.txt)
+    returns the image file names
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    radius = size/(2.*resolution)
+    files = []
+    with open(os.path.join(folder,'synthetic.txt'),'w') as f:
+        f.write('% image, seed, median diameter (mm), sorting (phi), resolution (mm/pixel), height, width (pixels)\n')
+        for i in range(number):
+            name = os.path.join(folder,'synthetic_%06d.%s' % (i, ext))
+            writebed( name, height, width, radius, sorting, seed+i )
+            f.write(', '.join([os.path.basename(name), str(seed+i), str(size), str(sorting), str(resolution), str(height), str(width)])+'\n')
+            files.append(name)
+    return files
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("========SYNTHETIC IMAGES===================")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   folder = ''; number = ''; width = ''; height = ''
+   size = ''; sorting = ''; resolution = ''; ext = ''; seed = ''
+
+   usage = 'dgs_synth.py [[-f <folder> -n <number of images> -x <width> -y <height> -s <median size (mm)> -g <sorting (phi)> -r <resolution (mm/pixel)> -t <png, jpg, tif or npy> -e <seed> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hf:n:x:y:s:g:r:t:e:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-f"):
+         folder = arg
+      elif opt in ("-n"):
+         number = arg
+      elif opt in ("-x"):
+         width = arg
+      elif opt in ("-y"):
+         height = arg
+      elif opt in ("-s"):
+         size = arg
+      elif opt in ("-g"):
+         sorting = arg
+      elif opt in ("-r"):
+         resolution = arg
+      elif opt in ("-t"):
+         ext = arg
+      elif opt in ("-e"):
+         seed = arg
+
+   folder = folder if folder else 'synthetic'
+   number = int(number) if number else 1
+   width = int(width) if width else 1024
+   height = int(height) if height else width
+   size = float(size) if size else 0.5
+   sorting = float(sorting) if sorting else 0.5
+   resolution = float(resolution) if resolution else 0.05
+   ext = ext.lower().lstrip('.') if ext else 'png'
+   seed = int(seed) if seed else 0
+
+   if ext not in ('png','jpg','tif','npy'):
+      print(usage)
+      sys.exit(2)
+
+   print(str(number)+' images of '+str(width)+' by '+str(height)+' pixels, median grain size '+str(size)+' mm, sorting '+str(sorting)+' phi, at '+str(resolution)+' mm/pixel')
+   files = makefolder( folder, number, height, width, size, sorting, resolution, ext, seed )
+   print(str(len(files))+' images written to '+folder+'; sizes listed in '+os.path.join(folder,'synthetic.txt'))
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################
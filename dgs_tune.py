@@ -0,0 +1,118 @@
+# dgs_tune.py
+# choice of worker processes and task sizes for wavelet-based digital grain size analysis
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_TUNE.PY
+ How many worker processes to use, and how many columns to give each
+ task, for an image of a given size on this machine
+
+ Each worker holds a plan (wavelet filters and smoothing kernels for
+ every scale, see dgs_plan.py) and, while transforming a block of
+ columns, several arrays of the padded column length for each column.
+ Both are worked out from the plan, so the workers and their tasks can
+ be sized to fit in the memory available, rather than being killed
+ for running out of it on large images. On small images, columns are
+ sent in blocks, a few per worker, rather than one task per column,
+ which costs more in overhead than the transform itself
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import os, multiprocessing
+
+# fraction of the available memory the workers may use between them
+memoryfraction = 0.5
+
+# tasks per worker, so that workers which finish early can take more
+tasksperworker = 4
+
+################################################################
+def cores():
+    """
+    number of processors this process may use
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        pass
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+################################################################
+def available():
+    """
+    bytes of memory available for new processes (None if unknown)
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except (IOError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+################################################################
+def planmemory(plan):
+    """
+    bytes held by a plan: filters (complex) and smoothing kernels (real) at each scale it transforms
+    """
+    return len(plan.active)*(16*plan.nfft+8*plan.npad)
+
+################################################################
+def columnmemory(plan):
+    """
+    bytes used, at once, for each column in a block being transformed:
+    the padded column, its transform, the filtered transform and the
+    wavelet coefficients at one scale (complex), the power and its
+    transform and the smoothed power (complex); and the result
+    """
+    return 8*plan.nfft+3*16*plan.nfft+8*plan.npad+2*16*plan.npad+8*plan.nscale
+
+################################################################
+def tune(plan, ncol, numproc='auto', chunk=None):
+    """
+    number of worker processes, and columns per task, for transforming
+    ncol columns with plan; if numproc is a number, that many workers are
+    used, and if chunk is given, tasks are that many columns (e.g. a row
+    of windows), and only the other is chosen
+    returns numproc, chunk
+    """
+    ncol = max(1,int(ncol))
+    auto = numproc=='auto'
+    fixed = chunk is not None
+    if auto:
+        ntasks = int(np.ceil(ncol/float(chunk))) if fixed else ncol
+        numproc = min(cores(),ntasks)
+    else:
+        numproc = int(numproc)
+
+    # a few tasks per worker
+    if not fixed:
+        chunk = max(1,int(np.ceil(ncol/float(numproc*tasksperworker))))
+
+    budget = available()
+    if budget is None:
+        return numproc, chunk
+    budget = memoryfraction*budget
+    perplan = planmemory(plan)
+    percolumn = columnmemory(plan)
+
+    # smaller tasks, then (if choosing) fewer workers, until they fit
+    if not fixed and numproc*(perplan+chunk*percolumn) > budget:
+        chunk = max(1,int((budget/numproc-perplan)/percolumn))
+    if auto and numproc*(perplan+chunk*percolumn) > budget:
+        numproc = max(1,int(budget/(perplan+chunk*percolumn)))
+    return numproc, chunk
@@ -0,0 +1,170 @@
+# dgs_validate.py
+# checks that the faster methods leave wavelet-based grain size statistics unchanged
+#====================================
+#   This function is part of 'dgs_wav.py' software
+#   This software is in the public domain because it contains materials that originally came
+#   from the United States Geological Survey, an agency of the United States Department of Interior.
+#   For more information, see the official USGS copyright policy at
+#   http://www.usgs.gov/visual-id/credit_usgs.html#copyright
+#====================================
+
+'''
+ DGS_VALIDATE.PY
+ Analyses each image twice, once with columns zero padded to powers of 2
+ (the original method) and once padded to fast lengths (the default, see
+ dgs_plan.py), and reports the difference in each statistic and the time
+ each took. If numba is installed, each image is also analysed with the
+ compiled kernels and with the numpy ones (see dgs_kernels.py), which
+ must give the same statistics (to within rounding). Exits with status 1
+ if any statistic differs by more than the tolerance, so it can be run
+ as a check after changing the transforms
+
+ OPTIONAL INPUTS [default values]
+ folder = folder of images (jpg, png, tif, npy) [the images folder next to this file]
+ density = process every density lines of image [10]
+ resolution = spatial resolution of image in mm/pixel [1]
+ tolerance = largest allowed difference in mean grain size, sorting,
+             skewness and kurtosis between the two paddings, in percent [2]
+
+ EXAMPLES:
+
+ 1) check with the example images
+ python dgs_validate.py
+
+ 2) check with your own images, analysing every 5th line
+ python dgs_validate.py -f /home/sed_images -d 5
+'''
+
+from __future__ import division, print_function
+import numpy as np
+import sys, getopt, os, time
+from dgs_core import cropcentral, processregion
+from dgs_io import readimage, listimages
+import dgs_kernels
+
+# largest difference (%) allowed between the numba and numpy kernels
+kerneltolerance = 1e-6
+
+################################################################
+############## SUBFUNCTIONS ####################################
+################################################################
+
+def comparepadding( region, density, resolution ):
+    """
+    statistics of an image region with each kind of padding
+    returns the percentage differences (fast - pow2) in mnsz, srt, sk, kurt
+    and the times taken with pow2 and fast padding
+    """
+    stats = {}
+    times = {}
+    for pad in ['pow2','fast']:
+        start = time.time()
+        stats[pad] = np.asarray(processregion( region, density, resolution, pad )[2:])
+        times[pad] = time.time()-start
+    diff = 100*(stats['fast']-stats['pow2'])/np.abs(stats['pow2'])
+    return diff, times['pow2'], times['fast']
+
+################################################################
+def comparekernels( region, density, resolution ):
+    """
+    statistics of an image region with the numpy and numba kernels
+    returns the percentage differences (numba - numpy) in mnsz, srt, sk, kurt
+    and the times taken with each (the first numba call includes compiling)
+    """
+    backend = dgs_kernels.backend
+    stats = {}
+    times = {}
+    try:
+        for name in ['numpy','numba']:
+            dgs_kernels.use(name)
+            start = time.time()
+            stats[name] = np.asarray(processregion( region, density, resolution )[2:])
+            times[name] = time.time()-start
+    finally:
+        dgs_kernels.use(backend)
+    diff = 100*(stats['numba']-stats['numpy'])/np.abs(stats['numpy'])
+    return diff, times['numpy'], times['numba']
+
+
+################################################################
+############## MAIN PROGRAM ####################################
+################################################################
+
+if __name__ == '__main__':
+
+   print("===========================================")
+   print("======DIGITAL GRAIN SIZE: WAVELET==========")
+   print("===========================================")
+   print("========CHECKS ON THE FAST METHODS=========")
+   print("===========================================")
+
+   # get list of input arguments and pre-allocate arrays
+   argv = sys.argv[1:]
+   folder = ''; density = ''
+   resolution = ''; tolerance = ''
+
+   usage = 'dgs_validate.py [[-f <folder of images> -d <density> -r <resolution (mm/pixel)> -t <tolerance (%)> ]]'
+
+   # parse inputs to variables
+   try:
+      opts, args = getopt.getopt(argv,"hf:d:r:t:")
+   except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+   for opt, arg in opts:
+      if opt == '-h':
+         print(usage)
+         sys.exit()
+      elif opt in ("-f"):
+         folder = arg
+      elif opt in ("-d"):
+         density = arg
+      elif opt in ("-r"):
+         resolution = arg
+      elif opt in ("-t"):
+         tolerance = arg
+
+   folder = folder if folder else os.path.join(os.path.dirname(os.path.abspath(__file__)),'images')
+   density = int(density) if density else 10
+   resolution = float(resolution) if resolution else 1
+   tolerance = float(tolerance) if tolerance else 2
+
+   files = sorted(set(listimages(folder)))
+   if not files:
+      print('no images in '+folder)
+      sys.exit(2)
+
+   regions = [cropcentral(readimage(item)) for item in files]
+   passed = True
+
+   print('Fast padding against powers of 2; tolerance is '+str(tolerance)+' %')
+   print('image, difference (%) in mean, sorting, skewness, kurtosis, time (s) with powers of 2, with fast lengths')
+   worst = 0
+   for item, region in zip(files, regions):
+      diff, tpow2, tfast = comparepadding( region, density, resolution )
+      worst = max(worst, np.max(np.abs(diff)))
+      print(os.path.basename(item)+', '+', '.join(['%.3f' % d for d in diff])+', %.2f, %.2f' % (tpow2, tfast))
+   print('largest difference is '+str(worst)+' %')
+   passed = passed and worst <= tolerance
+
+   if dgs_kernels.numba is None:
+      print('numba is not installed: compiled kernels not checked')
+   else:
+      print('numba kernels against numpy; tolerance is '+str(kerneltolerance)+' %')
+      print('image, difference (%) in mean, sorting, skewness, kurtosis, time (s) with numpy, with numba')
+      worst = 0
+      for item, region in zip(files, regions):
+         diff, tnumpy, tnumba = comparekernels( region, density, resolution )
+         worst = max(worst, np.max(np.abs(diff)))
+         print(os.path.basename(item)+', '+', '.join(['%.2g' % d for d in diff])+', %.2f, %.2f' % (tnumpy, tnumba))
+      print('largest difference is '+str(worst)+' %')
+      passed = passed and worst <= kerneltolerance
+
+   if not passed:
+      print('FAILED')
+      sys.exit(1)
+   print('passed')
+
+################################################################
+############## END OF MAIN PROGRAM #############################
+################################################################